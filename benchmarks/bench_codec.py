@@ -0,0 +1,94 @@
+"""Micro-benchmarks for the v2 packet codec on typical drive, LED and streaming packets.
+
+Run with ``python -m benchmarks.bench_codec`` from the repository root."""
+import struct
+import timeit
+
+from spherov2.controls.v2 import Packet
+from spherov2.helper import packet_chk
+
+
+def legacy_escape(packet):
+    escaped_packet = bytearray([Packet.Encoding.start])
+    for c in packet:
+        if c == Packet.Encoding.escape:
+            escaped_packet.extend((Packet.Encoding.escape, Packet.Encoding.escaped_escape))
+        elif c == Packet.Encoding.start:
+            escaped_packet.extend((Packet.Encoding.escape, Packet.Encoding.escaped_start))
+        elif c == Packet.Encoding.end:
+            escaped_packet.extend((Packet.Encoding.escape, Packet.Encoding.escaped_end))
+        else:
+            escaped_packet.append(c)
+    escaped_packet.append(Packet.Encoding.end)
+    return escaped_packet
+
+
+def legacy_build(packet):
+    raw = bytearray([packet.flags])
+    if packet.flags & Packet.Flags.has_target_id:
+        raw.append(packet.tid)
+    if packet.flags & Packet.Flags.has_source_id:
+        raw.append(packet.sid)
+    raw.extend(packet.id)
+    raw.extend(packet.data)
+    raw.append(packet_chk(raw))
+    return legacy_escape(raw)
+
+
+def legacy_unescape(response_data):
+    raw_data = []
+    iter_response_data = iter(response_data)
+    for b in iter_response_data:
+        if b == Packet.Encoding.escape:
+            b = next(iter_response_data, None)
+            if b == Packet.Encoding.escaped_escape:
+                b = Packet.Encoding.escape
+            elif b == Packet.Encoding.escaped_start:
+                b = Packet.Encoding.start
+            elif b == Packet.Encoding.escaped_end:
+                b = Packet.Encoding.end
+            raw_data.append(b)
+        else:
+            raw_data.append(b)
+    return raw_data
+
+
+def typical_packets():
+    flags = Packet.Flags.requests_response | Packet.Flags.is_activity
+    target = flags | Packet.Flags.has_target_id | Packet.Flags.has_source_id
+    return {
+        'drive': Packet(flags, 22, 7, 42, None, None, bytearray([128, 0, 90, 0])),
+        'drive (escaped)': Packet(flags, 22, 7, 0xab, None, None, bytearray([0xd8, 0, 0x8d, 0])),
+        'led 32 bit mask': Packet(target, 26, 26, 7, 0x11, 0x1, bytearray([0, 0x3f, 0xff, 0xff, *[255, 0, 128] * 10])),
+        'streaming': Packet(Packet.Flags.is_activity, 24, 2, 3, None, None,
+                            bytearray(struct.pack('>9f', *(i * 1.37 for i in range(9))))),
+    }
+
+
+def bench(stmt, number=20000):
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    escape, unescape = Packet._Packet__escape_data, Packet._Packet__unescape_data
+    print(f'{"packet":<20}{"legacy escape":>15}{"escape":>9}{"legacy unescape":>17}{"unescape":>10}'
+          f'{"legacy build":>14}{"build":>8}{"parse":>8}  (us)')
+    for name, packet in typical_packets().items():
+        frame = packet.build()
+        escaped = frame[1:-1]
+        raw = unescape(escaped)
+        print(f'{name:<20}'
+              f'{bench(lambda: legacy_escape(raw)):>15.2f}'
+              f'{bench(lambda: escape(raw)):>9.2f}'
+              f'{bench(lambda: legacy_unescape(escaped)):>17.2f}'
+              f'{bench(lambda: unescape(escaped)):>10.2f}'
+              f'{bench(lambda: legacy_build(packet)):>14.2f}'
+              f'{bench(packet.build):>8.2f}'
+              f'{bench(lambda: Packet.parse_response(frame)):>8.2f}')
+        assert bytes(legacy_unescape(escaped)) == raw
+        assert legacy_escape(raw) == legacy_build(packet) == frame
+        assert Packet.parse_response(frame).to_packet() == packet._replace(err=Packet.Error.success)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Micro-benchmarks for the packet framers.
+
+Run with ``python -m benchmarks.bench_collector`` from the repository root."""
+import struct
+import timeit
+
+from spherov2.controls.v1 import Packet as PacketV1
+from spherov2.controls.v2 import Packet as PacketV2
+
+
+class LegacyCollectorV2:
+    """The per-byte list collector that ``spherov2.controls.v2.Packet.Collector`` replaced"""
+
+    def __init__(self, callback):
+        self.__callback = callback
+        self.__data = []
+
+    def add(self, data):
+        for b in data:
+            self.__data.append(b)
+            if b == PacketV2.Encoding.end:
+                pkt = self.__data
+                self.__data = []
+                self.__callback(PacketV2.parse_response(pkt))
+
+
+class LegacyCollectorV1:
+    """The copying collector that ``spherov2.controls.v1.Packet.Collector`` replaced"""
+
+    def __init__(self, callback):
+        self.__callback = callback
+        self.__data = bytearray()
+
+    def add(self, data):
+        if not self.__data:
+            while data and data[0] != PacketV1.SOP:
+                data.pop(0)
+        self.__data.extend(data)
+        while len(self.__data) > 4:
+            sop1, sop2, *payload = self.__data
+            if sop2 == PacketV1.SOP:
+                _, _, dlen, *remain = payload
+                if dlen > len(remain):
+                    break
+                self.__callback(PacketV1.parse_response(payload[:dlen + 3]))
+                self.__data = remain[dlen:]
+            else:
+                _, dlen_msb, dlen_lsb, *remain = payload
+                dlen = (dlen_msb << 8) | dlen_lsb
+                if dlen > len(remain):
+                    break
+                self.__callback(PacketV1.parse_async(payload[:dlen + 3]))
+                self.__data = remain[dlen:]
+
+
+def sensor_stream_v1(n=100, shorts=15, per_notification=4):
+    """Builds ``n`` async sensor streaming packets interleaved with responses, several per notification."""
+    packets = []
+    for seq in range(n):
+        data = struct.pack('>%dh' % shorts, *(i * 10 - seq for i in range(shorts)))
+        packets.append(PacketV1.Async(3, bytearray(data)).build())
+        packets.append(PacketV1.Response(PacketV1.Error.command_succeeded, seq % 0x100, bytearray()).build())
+    return [bytearray(b''.join(packets[i:i + per_notification])) for i in range(0, len(packets), per_notification)]
+
+
+def sensor_stream_v2(n=100, floats=9):
+    """Builds ``n`` sensor streaming notifications, chunked the way a BLE link delivers them."""
+    stream = bytearray()
+    for seq in range(n):
+        data = struct.pack('>%df' % floats, *(i * .5 + seq for i in range(floats)))
+        stream.extend(PacketV2(PacketV2.Flags.is_activity, 24, 2, seq % 0xff, None, None, data).build())
+    return [bytes(stream[i:i + 20]) for i in range(0, len(stream), 20)]
+
+
+def bench(name, collector_cls, chunks, number=20):
+    count = []
+    collector = collector_cls(count.append)
+
+    def run():
+        for chunk in chunks:
+            collector.add(chunk)
+
+    elapsed = min(timeit.repeat(run, number=number, repeat=5)) / number
+    print(f'{name:<24}{elapsed * 1e3:>10.3f} ms / {len(count) // (number * 5)} packets')
+    return elapsed
+
+
+def main():
+    chunks = sensor_stream_v1()
+    legacy = bench('v1 legacy collector', LegacyCollectorV1, chunks)
+    current = bench('v1 collector', PacketV1.Collector, chunks)
+    print(f'speedup: {legacy / current:.2f}x')
+
+    chunks = sensor_stream_v2()
+    legacy = bench('v2 legacy collector', LegacyCollectorV2, chunks)
+    current = bench('v2 collector', PacketV2.Collector, chunks)
+    print(f'speedup: {legacy / current:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""Commands per second issued one at a time and submitted through the pipeline, against a simulated toy with link
+latency. Exits with an error if a submitted command, including one waiting for a notification after its response,
+returns something else than the same command issued blocking.
+
+Run with ``python -m benchmarks.bench_pipeline`` from the repository root."""
+import sys
+import time
+
+from spherov2.adapter.simulated_adapter import get_simulated_adapter
+from spherov2.toy.bb9e import BB9E
+
+COMMANDS = 40
+LATENCY = .02
+
+
+def blocking(toy, command):
+    return [command() for _ in range(COMMANDS)]
+
+
+def submitted(toy, command):
+    return [future.result(30) for future in [toy.submit(command) for _ in range(COMMANDS)]]
+
+
+def main():
+    adapter = get_simulated_adapter(BB9E, latency=LATENCY)
+    device, = adapter.scan_toys()
+    failed = 0
+    with BB9E(device, adapter) as toy:
+        toy.pipeline(8)
+        for name in ('get_battery_voltage', 'get_secondary_main_app_version'):
+            command = getattr(toy, name)
+            expected = command()
+            for run in (blocking, submitted):
+                start = time.perf_counter()
+                results = run(toy, command)
+                elapsed = time.perf_counter() - start
+                wrong = sum(result != expected for result in results)
+                failed += wrong
+                print(f'{name:<32}{run.__name__:<10}{COMMANDS / elapsed:>10.1f} commands / s'
+                      f'{f"  {wrong} wrong" if wrong else ""}')
+    if failed:
+        sys.exit(f'{failed} commands returned a wrong result')
+
+
+if __name__ == '__main__':
+    main()
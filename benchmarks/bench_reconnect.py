@@ -0,0 +1,55 @@
+"""Memory retained over many connect/disconnect cycles of simulated toys. Exits with an error if toys are kept alive
+after they are closed.
+
+Run with ``python -m benchmarks.bench_reconnect`` from the repository root."""
+import gc
+import sys
+import tracemalloc
+import weakref
+
+from spherov2.adapter.simulated_adapter import get_simulated_adapter
+from spherov2.toy.bb9e import BB9E
+from spherov2.toy.rvr import RVR
+from spherov2.toy.sphero import Sphero
+from spherov2.utils import ToyUtil
+
+CYCLES = 50
+
+
+def cycle(toy_cls, device, adapter, refs):
+    toy = toy_cls(device, adapter)
+    with toy:
+        ToyUtil.add_listeners(toy, None)
+        toy.sensor_control.enable('accelerometer')
+        ToyUtil.set_main_led(toy, 255, 0, 0, False)
+        toy.sensor_control.disable_all()
+    refs.append(weakref.ref(toy))
+
+
+def bench(toy_cls):
+    adapter = get_simulated_adapter(toy_cls)
+    device, = adapter.scan_toys()
+    refs = []
+    cycle(toy_cls, device, adapter, refs)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(CYCLES):
+        cycle(toy_cls, device, adapter, refs)
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    growth = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    alive = sum(ref() is not None for ref in refs)
+    print(f'{toy_cls.__name__:<10}{alive:>6} of {len(refs)} toys alive{growth / CYCLES:>12.0f} bytes / cycle')
+    return alive
+
+
+def main():
+    alive = sum(bench(toy_cls) for toy_cls in (Sphero, BB9E, RVR))
+    if alive:
+        sys.exit(f'{alive} closed toys are still alive')
+
+
+if __name__ == '__main__':
+    main()
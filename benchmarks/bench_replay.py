@@ -0,0 +1,166 @@
+"""Throughput of the sensor decoders, fed from recorded packet traces by the replay adapter.
+
+Run with ``python -m benchmarks.bench_replay`` from the repository root."""
+import os
+import struct
+import tempfile
+import threading
+import time
+import timeit
+
+from spherov2.adapter.replay_adapter import get_replay_adapter
+from spherov2.adapter.tcp_adapter import MockDevice
+from spherov2.controls import ResponseModes
+from spherov2.controls.v1 import Packet as PacketV1
+from spherov2.controls.v2 import Packet as PacketV2
+from spherov2.dispatch import Dispatcher
+from spherov2.toy.bb9e import BB9E
+from spherov2.toy.rvr import RVR
+from spherov2.toy.sphero import Sphero
+from spherov2.trace import Directions, TraceReader, TraceWriter, get_tapped_adapter
+
+SAMPLES = 5000
+
+
+class CaptureAdapter:
+    """Adapter answering nothing and keeping every byte written to it"""
+    written = {}
+
+    def __init__(self, address):
+        pass
+
+    def close(self):
+        pass
+
+    def set_callback(self, uuid, cb):
+        pass
+
+    def write(self, uuid, data):
+        CaptureAdapter.written.setdefault(uuid, bytearray()).extend(data)
+
+    def write_many(self, uuid, fragments):
+        for fragment in fragments:
+            self.write(uuid, fragment)
+
+
+def quiet(toy_cls, toy):
+    """Makes the toy send its sensor configuration without waiting for responses, which the traces do not hold"""
+    toy.set_response_mode(ResponseModes.NEVER, 2 if toy_cls._packet is PacketV1 else 24)
+
+
+def record(path, toy_cls, device, setup, notifications):
+    """Writes a trace of ``setup`` configuring the toy through a tapped adapter, followed by ``notifications``"""
+    CaptureAdapter.written = {}
+    with TraceWriter(path, device.name, device.address) as writer:
+        with toy_cls(device, get_tapped_adapter(CaptureAdapter, writer)) as toy:
+            quiet(toy_cls, toy)
+            setup(toy)
+        for notification in notifications:
+            writer.rx(toy_cls._response_uuid, notification)
+    traced = b''.join(r.data for r in TraceReader(path)
+                     if r.direction == Directions.TX and r.uuid == toy_cls._send_uuid)
+    if traced != CaptureAdapter.written[toy_cls._send_uuid]:
+        raise RuntimeError('The trace differs from the bytes written to the adapter')
+
+
+def replay(path, toy_cls, setup, add_listener, count):
+    """Replays the trace at ``path`` as fast as possible, returning the decoded samples and their rate"""
+    adapter = get_replay_adapter(path, realtime=False)
+    samples = []
+    done = threading.Event()
+    times = []
+
+    def listener(sample):
+        samples.append(sample)
+        times.append(time.perf_counter())
+        if len(samples) == count:
+            done.set()
+
+    device, = adapter.scan_toys()
+    toy = toy_cls(device, adapter)
+    toy.dispatcher = Dispatcher(max_workers=1, max_pending=count)
+    with toy:
+        quiet(toy_cls, toy)
+        add_listener(toy, listener)
+        setup(toy)
+        if not done.wait(60):
+            raise RuntimeError(f'Only {len(samples)} of {count} samples decoded')
+    if adapter.mismatches:
+        raise RuntimeError(f'{len(adapter.mismatches)} writes differ from the recording')
+    return samples, (count - 1) / (times[-1] - times[0])
+
+
+def sensor_notifications_v1(n, shorts):
+    return [PacketV1.Async(3, bytearray(struct.pack('>%dh' % shorts, *(i * 10 - seq for i in range(shorts))))).build()
+            for seq in range(n)]
+
+
+def sensor_notifications_v2(n, floats):
+    return [PacketV2(PacketV2.Flags.is_activity, 24, 2, 0xff, None, None,
+                     struct.pack('>%df' % floats, *(i * .5 + seq for i in range(floats)))).build() for seq in range(n)]
+
+
+def streaming_notifications(n, slot, values):
+    flags = PacketV2.Flags.is_activity | PacketV2.Flags.has_source_id
+    return [PacketV2(flags, 24, 61, 0xff, None, 0x12,
+                     bytes([slot]) + struct.pack('>%dI' % values, *((seq * 7919 + i) & 0xffffffff
+                                                                     for i in range(values)))).build()
+            for seq in range(n)]
+
+
+def bench(name, path, toy_cls, sensors, notifications, add_listener, setup):
+    device = MockDevice(name, 'replay')
+    record(path, toy_cls, device, setup, notifications)
+    samples, rate = replay(path, toy_cls, setup, add_listener, len(notifications))
+    print(f'{name:<24}{rate:>12.0f} samples / s ({", ".join(sensors)})')
+    return samples
+
+
+def sensor_control(sensors):
+    return (lambda toy, listener: toy.sensor_control.add_sensor_data_listener(listener),
+            lambda toy: toy.sensor_control.enable(*sensors))
+
+
+def components(toy_cls, sensors):
+    streamed = {**toy_cls.sensors, **toy_cls.extended_sensors}
+    return sum(len(streamed[sensor]) for sensor in sensors)
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'trace.bin')
+    try:
+        sensors = ('attitude', 'accelerometer', 'gyroscope', 'locator', 'velocity')
+        bench('Sphero SensorControl', path, Sphero, sensors,
+              sensor_notifications_v1(SAMPLES, components(Sphero, sensors)), *sensor_control(sensors))
+
+        sensors = ('attitude', 'accelerometer', 'locator', 'velocity')
+        samples = bench('BB-9E SensorControl', path, BB9E, sensors,
+                        sensor_notifications_v2(SAMPLES, components(BB9E, sensors)), *sensor_control(sensors))
+
+        sensors = ('imu', 'accelerometer', 'gyroscope')
+        bench('RVR StreamingControl', path, RVR, sensors, streaming_notifications(SAMPLES, 1, 9),
+              lambda toy, listener: toy.sensor_control.add_sensor_data_listener(listener),
+              lambda toy: toy.sensor_control.enable(*sensors))
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+    try:
+        from spherov2.sphero_edu import SpheroEduAPI
+    except ImportError as e:
+        print(f'SpheroEduAPI skipped: {e}')
+        return
+    api = SpheroEduAPI(BB9E(MockDevice('BB-9E', 'replay'), CaptureAdapter))
+
+    def run():
+        for sample in samples:
+            api._sensor_data_listener(sample)
+
+    elapsed = min(timeit.repeat(run, number=1, repeat=5))
+    print(f'{"SpheroEduAPI listener":<24}{len(samples) / elapsed:>12.0f} samples / s')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,22 @@
 import asyncio
 import threading
+from concurrent import futures
 
 import bleak
 
 
+def get_bleak_adapter(write_without_response: bool = True):
+    """Gets an anonymous ``BleakAdapter`` that, with ``write_without_response``, writes without response to the
+    characteristics allowing it. Such writes are not acknowledged one by one: each batch of fragments is handed to the
+    Bluetooth stack in a single coroutine, and the next batch waits only until the stack has taken the previous one
+    into its buffer. A failed write is therefore raised by the write after it, which is then not made, or by
+    ``close`` for the last one. A toy leaving its ``with`` block on another exception only prints that error."""
+    return type('BleakAdapter', (BleakAdapter,), {'write_without_response': write_without_response})
+
+
 class BleakAdapter:
+    write_without_response = False
+
     @staticmethod
     def scan_toys(timeout: float = 5.0):
         return asyncio.run(bleak.discover(timeout))
@@ -13,6 +25,8 @@ class BleakAdapter:
         self.__event_loop = asyncio.new_event_loop()
         self.__device = bleak.BleakClient(address, loop=self.__event_loop, timeout=5.0)
         self.__lock = threading.Lock()
+        self.__with_response = {}
+        self.__pending = None
         self.__thread = threading.Thread(target=self.__event_loop.run_forever)
         self.__thread.start()
         try:
@@ -25,16 +39,84 @@ class BleakAdapter:
         with self.__lock:
             return asyncio.run_coroutine_threadsafe(coroutine, self.__event_loop).result()
 
+    @property
+    def mtu(self) -> int:
+        return getattr(self.__device, 'mtu_size', 23)
+
     def close(self, disconnect=True):
-        if disconnect:
-            self.__execute(self.__device.disconnect())
-        with self.__lock:
-            self.__event_loop.call_soon_threadsafe(self.__event_loop.stop)
-            self.__thread.join()
-        self.__event_loop.close()
+        """Disconnects, then raises the error of the last batch written without response if it failed"""
+        pending, self.__pending = self.__pending, None
+        try:
+            if pending is not None:
+                futures.wait([pending])
+            if disconnect:
+                self.__execute(self.__device.disconnect())
+        finally:
+            with self.__lock:
+                self.__event_loop.call_soon_threadsafe(self.__event_loop.stop)
+                self.__thread.join()
+            self.__event_loop.close()
+        if pending is not None:
+            pending.result()
 
     def set_callback(self, uuid, cb):
         self.__execute(self.__device.start_notify(uuid, cb))
 
     def write(self, uuid, data):
-        self.__execute(self.__device.write_gatt_char(uuid, data, True))
+        self.write_many(uuid, [data])
+
+    def write_many(self, uuid, fragments):
+        """Writes ``fragments`` to ``uuid`` in order, in a single coroutine"""
+        response = self.__response(uuid)
+        with self.__lock:
+            pending, self.__pending = self.__pending, None
+            if pending is not None:
+                pending.result()
+            future = asyncio.run_coroutine_threadsafe(self.__write_all(uuid, fragments, response), self.__event_loop)
+            if response:
+                future.result()
+            else:
+                self.__pending = future
+
+    def __response(self, uuid) -> bool:
+        try:
+            return self.__with_response[uuid]
+        except KeyError:
+            response = True
+            if self.write_without_response:
+                characteristic = self.__device.services.get_characteristic(uuid)
+                response = characteristic is None or 'write-without-response' not in characteristic.properties
+            self.__with_response[uuid] = response
+            return response
+
+    async def __write_all(self, uuid, fragments, response):
+        for fragment in fragments:
+            await self.__device.write_gatt_char(uuid, fragment, response)
+
+
+class AsyncBleakAdapter:
+    """Adapter for :class:`spherov2.aio.AsyncToy`, running on the caller's event loop"""
+
+    @staticmethod
+    async def scan_toys(timeout: float = 5.0):
+        return await bleak.discover(timeout)
+
+    def __init__(self, address):
+        self.__device = bleak.BleakClient(address, timeout=5.0)
+
+    async def connect(self):
+        await self.__device.connect()
+
+    @property
+    def mtu(self) -> int:
+        return getattr(self.__device, 'mtu_size', 23)
+
+    async def close(self, disconnect=True):
+        if disconnect:
+            await self.__device.disconnect()
+
+    async def set_callback(self, uuid, cb):
+        await self.__device.start_notify(uuid, cb)
+
+    async def write(self, uuid, data):
+        await self.__device.write_gatt_char(uuid, data, True)
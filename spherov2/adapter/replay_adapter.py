@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import defaultdict
+
+from spherov2.adapter.tcp_adapter import MockDevice
+from spherov2.trace import TraceReader, Directions
+
+
+def get_replay_adapter(path: str, realtime: bool = True, check_writes: bool = True):
+    """Gets an anonymous ``ReplayAdapter`` playing back the trace at ``path``, written by
+    :class:`spherov2.trace.TraceWriter`.
+
+    Notifications are delivered with their original spacing if ``realtime`` is set, or as fast as possible otherwise.
+    With ``check_writes``, playback stops at each recorded write until the toy has written as many bytes to that
+    characteristic, so that responses never arrive before their requests, and written bytes differing from the
+    recording are collected in ``ReplayAdapter.mismatches``. Without it, recorded writes are skipped. The
+    ``ReplayAdapter.finished`` event is set once the whole trace has been played."""
+    reader = TraceReader(path)
+    records = list(reader)
+
+    class ReplayAdapter:
+        finished = threading.Event()
+        mismatches = []
+
+        @staticmethod
+        def scan_toys(timeout=5.0):
+            return [MockDevice(reader.header.toy_type, reader.header.address)]
+
+        def __init__(self, address):
+            self.__callbacks = {}
+            self.__written = defaultdict(bytearray)
+            self.__cond = threading.Condition()
+            self.__closed = False
+            self.__thread = threading.Thread(target=self.__play, daemon=True)
+
+        def __play(self):
+            recorded = defaultdict(int)
+            anchor = None
+            for record in records:
+                if record.direction == Directions.TX:
+                    if not check_writes:
+                        continue
+                    recorded[record.uuid] += len(record.data)
+                    size = recorded[record.uuid]
+                    written = self.__written[record.uuid]
+                    with self.__cond:
+                        self.__cond.wait_for(lambda: self.__closed or len(written) >= size)
+                        if self.__closed:
+                            return
+                        actual = bytes(written[size - len(record.data):size])
+                    if actual != record.data:
+                        ReplayAdapter.mismatches.append((record, actual))
+                    anchor = time.monotonic(), record.timestamp
+                    continue
+                if realtime:
+                    if anchor is None:
+                        anchor = time.monotonic(), record.timestamp
+                    delay = anchor[0] + record.timestamp - anchor[1] - time.monotonic()
+                    if delay > 0:
+                        with self.__cond:
+                            if self.__cond.wait_for(lambda: self.__closed, delay):
+                                return
+                if self.__closed:
+                    return
+                callback = self.__callbacks.get(record.uuid)
+                if callback is not None:
+                    callback(record.uuid, record.data)
+            ReplayAdapter.finished.set()
+
+        def close(self):
+            with self.__cond:
+                self.__closed = True
+                self.__cond.notify_all()
+            if self.__thread.is_alive():
+                self.__thread.join()
+
+        def set_callback(self, uuid, cb):
+            self.__callbacks[uuid] = cb
+            if self.__thread.ident is None:
+                self.__thread.start()
+
+        def write(self, uuid, data):
+            if check_writes:
+                with self.__cond:
+                    self.__written[uuid].extend(data)
+                    self.__cond.notify_all()
+
+    return ReplayAdapter
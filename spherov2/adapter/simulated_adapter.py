@@ -0,0 +1,420 @@
+import heapq
+import itertools
+import math
+import random
+import struct
+import threading
+import time
+import traceback
+from collections import defaultdict
+from functools import partial
+
+from spherov2.adapter.tcp_adapter import MockDevice
+from spherov2.controls.v1 import Packet as PacketV1
+from spherov2.controls.v2 import Packet as PacketV2
+from spherov2.helper import to_int, packet_chk
+
+# Number of values of each streaming service of the RVR, by service id
+_streaming_services = {0: 4, 1: 3, 2: 3, 3: 5, 4: 3, 5: 1, 6: 2, 7: 2, 8: 1, 9: 1, 10: 1}
+_streaming_data_formats = {0: 'B', 1: 'H', 2: 'I'}
+
+# Canned data of the responses that toys decode, by (did, cid). Other commands are answered without data.
+_responses = {
+    PacketV1: {(0x00, 0x20): struct.pack('>2B3H', 1, 2, 780, 0, 0)},
+    PacketV2: {(0x13, 0x03): struct.pack('>H', 780), (0x13, 0x04): bytes([2]), (0x13, 0x17): bytes([1])},
+}
+
+# Notifications v2 toys send shortly after answering a command, as (did, cid, data) by the (did, cid) of the command
+_followup_delay = .05
+_followups = {(0x11, 0x17): (0x11, 0x18, struct.pack('>3H', 4, 2, 0)),
+              (0x11, 0x24): (0x11, 0x25, struct.pack('>3H', 4, 0, 0))}
+
+_top_speed = 200.
+"""Speed of a simulated toy driven at 255, in cm/s"""
+
+
+class _Scheduler:
+    """Runs the timed events of every simulated toy on a single thread"""
+
+    def __init__(self):
+        self.__cond = threading.Condition()
+        self.__events = []
+        self.__counter = itertools.count()
+        self.__thread = None
+
+    def call_at(self, when: float, f, *args):
+        with self.__cond:
+            heapq.heappush(self.__events, (when, next(self.__counter), f, args))
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, name='simulated-toys', daemon=True)
+                self.__thread.start()
+            self.__cond.notify()
+
+    def __run(self):
+        events = self.__events
+        while True:
+            with self.__cond:
+                while True:
+                    now = time.monotonic()
+                    if events and events[0][0] <= now:
+                        _, _, f, args = heapq.heappop(events)
+                        break
+                    self.__cond.wait(events[0][0] - now if events else None)
+            try:
+                f(*args)
+            except Exception:
+                traceback.print_exc()
+
+
+class _Link:
+    """Carries packets between a toy and its firmware, delaying them by ``latency`` plus up to ``jitter`` seconds
+    and dropping them with probability ``loss``. Notifications keep their order."""
+
+    def __init__(self, scheduler: _Scheduler, rng: random.Random, uuid, latency, jitter, loss):
+        self.scheduler = scheduler
+        self.callback = None
+        self.closed = False
+        self.__rng = rng
+        self.__uuid = uuid
+        self.__latency = latency
+        self.__jitter = jitter
+        self.__loss = loss
+        self.__lock = threading.Lock()
+        self.__due = 0.
+
+    def __delay(self) -> float:
+        return time.monotonic() + self.__latency + self.__rng.uniform(0, self.__jitter)
+
+    def request(self, handle, packet):
+        """Hands a request to the firmware"""
+        if self.__rng.random() >= self.__loss:
+            self.scheduler.call_at(self.__delay(), self.__run, handle, packet)
+
+    def __run(self, handle, packet):
+        if not self.closed:
+            handle(packet)
+
+    def send(self, data):
+        """Notifies the toy of ``data``, in fragments of 20 bytes"""
+        if self.__rng.random() >= self.__loss:
+            with self.__lock:
+                self.__due = max(self.__due, self.__delay())
+                due = self.__due
+            self.scheduler.call_at(due, self.__deliver, data)
+
+    def __deliver(self, data):
+        callback = self.callback
+        if callback is None or self.closed:
+            return
+        for i in range(0, len(data), 20):
+            callback(self.__uuid, data[i:i + 20])
+
+
+class _Firmware:
+    """Emulates the firmware of a toy of class ``toy_cls``: the handshake, the motion driven by drive commands, and
+    the sensor readings it results in"""
+
+    def __init__(self, toy_cls, link: _Link):
+        self.toy_cls = toy_cls
+        self.link = link
+        self.locked = {uuid for uuid, _ in toy_cls._handshake}
+        self.responses = _responses[toy_cls._packet]
+        self.collision_detection = False
+        self.__handshake = {uuid: bytes(data) for uuid, data in toy_cls._handshake}
+        self.__streams = defaultdict(int)
+        self.__heading = 0
+        self.__speed = 0.
+        self.__position = (0., 0.)
+        self.__moved = time.monotonic()
+
+    def handshake(self, uuid, data):
+        if self.__handshake.get(uuid) == bytes(data):
+            self.locked.discard(uuid)
+
+    def drive(self, speed, heading):
+        self.__position = self.__locate()
+        self.__moved = time.monotonic()
+        self.__speed = speed * _top_speed / 255
+        self.__heading = heading % 360
+
+    @property
+    def moving(self) -> bool:
+        return self.__speed > 0
+
+    def __locate(self):
+        distance = self.__speed * (time.monotonic() - self.__moved)
+        heading = math.radians(self.__heading)
+        x, y = self.__position
+        return x + distance * math.sin(heading), y + distance * math.cos(heading)
+
+    def sample(self, sensor, component) -> float:
+        """Reading of a component of a sensor, in the units toys report after decoding"""
+        if sensor in ('attitude', 'imu') and component == 'yaw':
+            return (self.__heading + 180) % 360 - 180
+        if (sensor, component) in (('accelerometer', 'z'), ('quaternion', 'w')):
+            return 1.
+        if sensor == 'velocity':
+            heading = math.radians(self.__heading)
+            return self.__speed * (math.sin(heading) if component == 'x' else math.cos(heading))
+        if sensor == 'locator':
+            return self.__locate()[component != 'x']
+        if sensor == 'speed':
+            return self.__speed
+        return 0.
+
+    def frame(self, mask, extended_mask):
+        """Readings selected by the streaming masks as ``(raw value, ToySensor)``, in the order toys decode them"""
+        values = []
+        for sensors, m in ((self.toy_cls.sensors, mask), (self.toy_cls.extended_sensors, extended_mask)):
+            for sensor, components in sensors.items():
+                if any(c.bit & m for c in components.values()):
+                    for name, c in components.items():
+                        value = self.sample(sensor, name)
+                        values.append((value if c.modifier is None else value / c.modifier(1.), c))
+        return values
+
+    def schedule(self, key, period, tick):
+        """Calls ``tick`` every ``period`` seconds in place of the previous stream ``key``, until it returns
+        ``False``, the stream is stopped or the toy disconnects"""
+        self.stop(key)
+        generation = self.__streams[key]
+
+        def run(when):
+            if self.link.closed or self.__streams[key] != generation or tick() is False:
+                return
+            self.link.scheduler.call_at(when + period, run, when + period)
+
+        start = time.monotonic() + period
+        self.link.scheduler.call_at(start, run, start)
+
+    def stop(self, key):
+        self.__streams[key] += 1
+
+    def counted(self, count, tick):
+        """Wraps ``tick`` to stop after ``count`` calls, or never if ``count`` is ``0``"""
+        remaining = [count]
+
+        def wrapper():
+            tick()
+            if count:
+                remaining[0] -= 1
+                return remaining[0] > 0
+
+        return wrapper
+
+
+class _FirmwareV1(_Firmware):
+    def __init__(self, toy_cls, link):
+        super().__init__(toy_cls, link)
+        self.__buffer = bytearray()
+
+    def received(self, data):
+        buf = self.__buffer
+        buf.extend(data)
+        while len(buf) >= 6:
+            if buf[0] != PacketV1.SOP or buf[1] not in (PacketV1.SOP, PacketV1.NO_ANSWER):
+                del buf[:1]
+                continue
+            end = 6 + buf[5]
+            if len(buf) < end:
+                break
+            self.link.request(self.__handle, bytes(buf[:end]))
+            del buf[:end]
+
+    def __handle(self, frame):
+        answer, did, cid, seq, data = frame[1] == PacketV1.SOP, frame[2], frame[3], frame[4], frame[6:-1]
+        if packet_chk(frame[2:-1]) != frame[-1]:
+            if answer:
+                self.link.send(PacketV1.Response(PacketV1.Error.checksum_failure, seq, bytearray()).build())
+            return
+        if (did, cid) == (0x02, 0x30):
+            self.drive(data[0] if data[3] == 1 else 0, to_int(data[1:3]) + (180 if data[4] else 0))
+        elif (did, cid) == (0x02, 0x11):
+            self.__stream(to_int(data[0:2]), to_int(data[2:4]), to_int(data[4:8]), data[8], to_int(data[9:13]))
+        elif (did, cid) == (0x02, 0x12):
+            self.collision_detection = data[0] != 0
+        if answer:
+            response = bytearray(self.responses.get((did, cid), b''))
+            self.link.send(PacketV1.Response(PacketV1.Error.command_succeeded, seq, response).build())
+
+    def __stream(self, divisor, frames, mask, count, extended_mask):
+        if not divisor or not frames or not mask | extended_mask:
+            self.stop('sensors')
+            return
+
+        def tick():
+            data = bytearray()
+            for _ in range(frames):
+                for value, c in self.frame(mask, extended_mask):
+                    data.extend(struct.pack('>h', int(min(max(value, c.min_value), c.max_value))))
+            self.link.send(PacketV1.Async(3, data).build())
+
+        self.schedule('sensors', divisor * frames / 400, self.counted(count, tick))
+
+    def collide(self):
+        speed = int(self.sample('speed', 'speed') * 255 / _top_speed)
+        self.link.send(PacketV1.Async(7, bytearray(struct.pack(
+            '>3hB2hBL', 0, -4096, 4096, 2, 0, 100, speed, int(time.monotonic() * 1000) & 0xffffffff))).build())
+
+
+class _FirmwareV2(_Firmware):
+    def __init__(self, toy_cls, link):
+        super().__init__(toy_cls, link)
+        self.__collector = PacketV2.Collector(partial(link.request, self.__handle))
+        self.__mask = self.__extended_mask = 0
+        self.__slots = defaultdict(dict)
+
+    def received(self, data):
+        self.__collector.add(data)
+
+    def __notify(self, did, cid, data, proc=None):
+        if proc is None:
+            packet = PacketV2(PacketV2.Flags.is_activity, did, cid, 0xff, None, None, data)
+        else:
+            flags = PacketV2.Flags.is_activity | PacketV2.Flags.has_target_id | PacketV2.Flags.has_source_id
+            packet = PacketV2(flags, did, cid, 0xff, 0x01, 0x10 | proc, data)
+        self.link.send(packet.build())
+
+    def __handle(self, request):
+        did, cid, data, tid = request.did, request.cid, request.data, request.tid
+        err = PacketV2.Error.success
+        if self.toy_cls._require_target and tid is None:
+            err = PacketV2.Error.bad_target_id
+        elif (did, cid) == (0x16, 0x07):
+            self.drive(data[0], to_int(data[1:3]) + (180 if data[3] & 1 else 0))
+        elif (did, cid) == (0x18, 0x00):
+            self.__mask = to_int(data[3:7])
+            self.__stream(to_int(data[0:2]), data[2])
+        elif (did, cid) == (0x18, 0x0c):
+            self.__extended_mask = to_int(data[0:4])
+        elif (did, cid) == (0x18, 0x11):
+            self.collision_detection = data[0] != 0
+        elif did == 0x18 and 57 <= cid <= 60:
+            self.__streaming_service(cid, (tid or 0) & 0xf, data)
+
+        flags = request.flags
+        if flags & PacketV2.Flags.requests_response or \
+                flags & PacketV2.Flags.requests_only_error_response and err != PacketV2.Error.success:
+            response = bytearray(self.responses.get((did, cid), b'') if err == PacketV2.Error.success else b'')
+            flags = PacketV2.Flags.is_response | flags & (PacketV2.Flags.has_target_id | PacketV2.Flags.has_source_id)
+            self.link.send(PacketV2(flags, did, cid, request.seq, request.sid, tid, response, err).build())
+        followup = _followups.get((did, cid))
+        if followup is not None and err == PacketV2.Error.success:
+            self.link.scheduler.call_at(time.monotonic() + _followup_delay, self.__notify, *followup)
+
+    def __stream(self, interval, count):
+        if not interval or not self.__mask | self.__extended_mask:
+            self.stop('sensors')
+            return
+        mask, extended_mask = self.__mask, self.__extended_mask
+
+        def tick():
+            values = [value for value, _ in self.frame(mask, extended_mask)]
+            self.__notify(0x18, 0x02, struct.pack('>%df' % len(values), *values))
+
+        self.schedule('sensors', interval / 1000, self.counted(count, tick))
+
+    def __streaming_service(self, cid, proc, data):
+        slots = self.__slots[proc]
+        if cid == 57:
+            slots[data[0]] = [(to_int(data[i:i + 2]), data[i + 2]) for i in range(1, len(data) - 2, 3)]
+        elif cid == 58:
+            self.__start_services(proc, dict(slots), to_int(data[0:2]))
+        else:
+            self.stop(('services', proc))
+            if cid == 60:
+                slots.clear()
+
+    def __start_services(self, proc, slots, period):
+        """Streams the configured slots of processor ``proc``. Services report a toy at rest: every value is
+        in the middle of its range."""
+        if not period or not slots:
+            return
+        payloads = []
+        for token, services in slots.items():
+            data = bytearray([token])
+            for service, size in services:
+                n = _streaming_services.get(service, 0)
+                data.extend(struct.pack('>%d%s' % (n, _streaming_data_formats[size]), *[1 << (8 << size) - 1] * n))
+            payloads.append(data)
+
+        def tick():
+            for payload in payloads:
+                self.__notify(0x18, 0x3d, payload, proc)
+
+        self.schedule(('services', proc), period / 1000, tick)
+
+    def collide(self):
+        speed = int(self.sample('speed', 'speed') * 255 / _top_speed)
+        self.__notify(0x18, 0x12, struct.pack(
+            '>3hB3hBL', 0, -4096, 4096, 2, 0, 100, 0, speed, int(time.monotonic() * 1000) & 0xffffffff),
+                      1 if self.toy_cls._require_target else None)
+
+
+def get_simulated_adapter(*toy_classes, count: int = 1, latency: float = 0., jitter: float = 0., loss: float = 0.,
+                          collision_interval: float = None, seed: int = None):
+    """Gets an anonymous ``SimulatedAdapter`` emulating ``count`` virtual toys of each of ``toy_classes``, speaking
+    their v1 or v2 protocol through the real packet codecs, with no Bluetooth hardware.
+
+    A virtual toy accepts requests once the handshake of its class has been written, and answers them with the seq
+    and error code the toy expects, following their response mode. Sensors stream at the configured interval and
+    masks, and so do the slots of ``StreamingControl``. Readings follow the drive commands, while streaming services
+    report a toy at rest. A moving toy with collision detection configured collides every ``collision_interval``
+    seconds, and ``SimulatedAdapter.connected[address].collide()`` makes a toy collide on demand.
+
+    Every packet is delayed by ``latency`` plus up to ``jitter`` seconds in either direction, and dropped with
+    probability ``loss``. All virtual toys share a single timer thread, so that hundreds of them can run in one
+    process. Create toys from the scanned devices, as in ``BB9E(device, SimulatedAdapter)``."""
+    rng = random.Random(seed)
+    scheduler = _Scheduler()
+    devices = {}
+    for toy_cls in toy_classes:
+        prefix = toy_cls.toy_type.prefix or toy_cls.toy_type.filter_prefix + '-'
+        for i in range(count):
+            devices[f'SIM-{toy_cls.__name__}-{i:04d}'] = toy_cls, f'{prefix}{i:04X}'
+
+    class SimulatedAdapter:
+        connected = {}
+
+        @staticmethod
+        def scan_toys(timeout=5.0):
+            return [MockDevice(name, address) for address, (_, name) in devices.items()]
+
+        def __init__(self, address):
+            toy_cls, _ = devices[address]
+            self.__address = address
+            self.__send_uuid = toy_cls._send_uuid
+            self.__response_uuid = toy_cls._response_uuid
+            self.__link = _Link(scheduler, rng, toy_cls._response_uuid, latency, jitter, loss)
+            self.__firmware = (_FirmwareV1 if toy_cls._packet is PacketV1 else _FirmwareV2)(toy_cls, self.__link)
+            if collision_interval:
+                self.__firmware.schedule('collisions', collision_interval, self.__collide_if_moving)
+            SimulatedAdapter.connected[address] = self
+
+        def __collide_if_moving(self):
+            if self.__firmware.moving:
+                self.collide()
+
+        def collide(self):
+            """Makes the toy report a collision, if collision detection is configured"""
+            if self.__firmware.collision_detection:
+                self.__firmware.collide()
+
+        def close(self):
+            self.__link.closed = True
+            self.__link.callback = None
+            SimulatedAdapter.connected.pop(self.__address, None)
+
+        def set_callback(self, uuid, cb):
+            if uuid == self.__response_uuid:
+                self.__link.callback = cb
+
+        def write(self, uuid, data):
+            if self.__link.closed:
+                raise ConnectionError('Simulated toy disconnected')
+            if uuid == self.__send_uuid and not self.__firmware.locked:
+                self.__firmware.received(data)
+            else:
+                self.__firmware.handshake(uuid, data)
+
+    return SimulatedAdapter
@@ -59,6 +59,7 @@ def get_tcp_adapter(host: str, port: int = 50004):
 
             self.__sequence = 0
             self.__sequence_wait = {}
+            self.__mtu = None
 
             self.__callbacks = {}
             self.__thread = threading.Thread(target=self.__recv)
@@ -78,6 +79,10 @@ def get_tcp_adapter(host: str, port: int = 50004):
                 if code == ResponseOp.OK:
                     self.__sequence_wait.pop(recvall(self.__socket, 1)[0]).set_result(None)
                     continue
+                if code == ResponseOp.VALUE:
+                    seq = recvall(self.__socket, 1)[0]
+                    self.__sequence_wait.pop(seq).set_result(to_int(recvall(self.__socket, 2)))
+                    continue
                 size = to_int(recvall(self.__socket, 2))
                 data = recvall(self.__socket, size)
                 if code == ResponseOp.ON_DATA:
@@ -97,7 +102,15 @@ def get_tcp_adapter(host: str, port: int = 50004):
             self.__sequence = (self.__sequence + 1) % 0x100
             f = self.__sequence_wait[seq] = futures.Future()
             self.__socket.sendall(cmd + bytes([seq]) + payload)
-            f.result()
+            return f.result()
+
+        @property
+        def mtu(self) -> int:
+            """ATT MTU negotiated by the relay with the toy, or the BLE default of 23 with relays that do not report
+            it"""
+            if self.__mtu is None:
+                self.__mtu = self.__send(RequestOp.GET_MTU, to_bytes(0, 2)) or 23
+            return self.__mtu
 
         def close(self):
             self.__socket.sendall(RequestOp.END)
@@ -6,10 +6,12 @@ class RequestOp(bytes, Enum):
     INIT = b'\x01'
     SET_CALLBACK = b'\x02'
     WRITE = b'\x03'
+    GET_MTU = b'\x04'
     END = b'\xff'
 
 
 class ResponseOp(bytes, Enum):
     OK = b'\x00'
     ON_DATA = b'\x01'
+    VALUE = b'\x02'
     ERROR = b'\xff'
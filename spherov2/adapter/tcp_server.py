@@ -57,6 +57,11 @@ async def process_connection(reader: asyncio.streams.StreamReader, writer: async
                         size = to_int(await reader.readexactly(2))
                         payload = bytearray(await reader.readexactly(size))
                         await adapter.write_gatt_char(data, payload, True)
+                    elif cmd == RequestOp.GET_MTU:
+                        mtu = getattr(adapter, 'mtu_size', 23)
+                        writer.write(ResponseOp.VALUE + bytes([seq]) + to_bytes(mtu, 2))
+                        await writer.drain()
+                        continue
                 except EOFError:
                     raise
                 except BaseException as e:
@@ -0,0 +1,257 @@
+import asyncio
+from collections import defaultdict, deque
+from functools import partial
+from types import FunctionType
+from typing import Callable, Type, AsyncIterator, Dict
+
+from spherov2.commanding import Captured, Awaited, Replay, CommandOptions
+from spherov2.controls import ResponseModes
+from spherov2.helper import max_write_size, lazy_property
+from spherov2.toy import Toy
+
+
+class _Deferred:
+    """Stands in for an :class:`AsyncToy` under a blocking controller: the commands the controller issues are
+    collected to be awaited in order, and its listeners are called on the event loop"""
+
+    def __init__(self, toy):
+        self.__toy = toy
+        self.calls = []
+        self.dispatcher = self
+
+    def __getattr__(self, name):
+        attr = getattr(self.__toy, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if asyncio.iscoroutine(result):
+                self.calls.append(result)
+            return result
+
+        return call
+
+    @staticmethod
+    def dispatch(listener, *args):
+        _call(listener, *args)
+
+    async def flush(self):
+        calls, self.calls = self.calls, []
+        try:
+            while calls:
+                await calls.pop(0)
+        finally:
+            for call in calls:
+                call.close()
+
+
+def _call(listener, *args):
+    result = listener(*args)
+    if asyncio.iscoroutine(result):
+        asyncio.ensure_future(result)
+
+
+async def _iterate(add_listener, remove_listener, max_pending) -> AsyncIterator:
+    """Iterates over what a listener registered by ``add_listener`` is called with, keeping only the latest
+    ``max_pending`` items while the iterating task is busy"""
+    pending = deque(maxlen=max_pending)
+    event = asyncio.Event()
+
+    def listener(*args):
+        pending.append(args[0] if len(args) == 1 else args)
+        event.set()
+
+    add_listener(listener)
+    try:
+        while True:
+            while pending:
+                yield pending.popleft()
+            event.clear()
+            await event.wait()
+    finally:
+        remove_listener(listener)
+
+
+class AsyncSensorControl:
+    """Sensor control of an :class:`AsyncToy`. It is the sensor control of the toy class, so readings are the same
+    dictionaries, with its configuration methods as coroutines. Readings can also be iterated with :meth:`stream`."""
+
+    def __init__(self, toy, toy_cls):
+        self.__deferred = _Deferred(toy)
+        self.__control = getattr(toy_cls, 'sensor_control').func(self.__deferred)
+
+    async def __configure(self, method, *args):
+        method(*args)
+        await self.__deferred.flush()
+
+    def add_sensor_data_listener(self, listener: Callable[[Dict[str, Dict[str, float]]], None]):
+        self.__control.add_sensor_data_listener(listener)
+
+    def remove_sensor_data_listener(self, listener: Callable[[Dict[str, Dict[str, float]]], None]):
+        self.__control.remove_sensor_data_listener(listener)
+
+    def stream(self, max_pending: int = 16) -> AsyncIterator[Dict[str, Dict[str, float]]]:
+        """Iterates over the sensor readings, keeping only the latest ``max_pending`` while the iterating task is
+        busy"""
+        return _iterate(self.add_sensor_data_listener, self.remove_sensor_data_listener, max_pending)
+
+    async def set_count(self, count: int):
+        await self.__configure(self.__control.set_count, count)
+
+    async def set_interval(self, interval: int):
+        await self.__configure(self.__control.set_interval, interval)
+
+    async def enable(self, *sensors):
+        await self.__configure(self.__control.enable, *sensors)
+
+    async def disable(self, *sensors):
+        await self.__configure(self.__control.disable, *sensors)
+
+    async def disable_all(self):
+        await self.__configure(self.__control.disable_all)
+
+
+class AsyncToy(CommandOptions):
+    """Drives a toy of class ``toy_cls`` from an asyncio event loop, through an adapter whose methods are coroutines
+    such as :class:`spherov2.adapter.bleak_adapter.AsyncBleakAdapter`.
+
+    Every command of ``toy_cls`` is a coroutine function here, and any number of commands may wait for their
+    responses at the same time. Listeners are called on the event loop, and coroutine listeners are scheduled as
+    tasks. Notifications can also be iterated with :meth:`listen`, and decoded sensor readings with
+    ``sensor_control.stream()``, an :class:`AsyncSensorControl`. The other controllers of ``toy_cls``, such as
+    ``drive_control``, are blocking and are not available. Error responses to commands sent without waiting for
+    their responses are passed to the error listeners.
+
+    A command is run a first time to build its packet, which is sent and awaited, then a second time with the
+    response, so that commands decode their responses exactly as with blocking toys."""
+
+    def __init__(self, toy_cls: Type[Toy], toy, adapter_cls):
+        self.address = toy.address
+        self.name = toy.name
+
+        super().__init__(toy_cls, self.__new_packet)
+        self.__toy_cls = toy_cls
+        self.__adapter = None
+        self.__adapter_cls = adapter_cls
+        self._packet_manager = toy_cls._packet.Manager()
+        self.__waiting = defaultdict(list)
+        self.__listeners = defaultdict(dict)
+        self.__write_lock = None
+        self.__write_size = 20
+
+    async def __aenter__(self):
+        if self.__adapter is not None:
+            raise RuntimeError('Toy already in context manager')
+        self.__write_lock = asyncio.Lock()
+        self.__adapter = self.__adapter_cls(self.address)
+        try:
+            await self.__adapter.connect()
+            self.__write_size = max_write_size(self.__adapter)
+            for uuid, data in self._handshake:
+                await self.__adapter.write(uuid, data)
+            await self.__adapter.set_callback(self._response_uuid, self.__api_read)
+        except:
+            await self.__aexit__(None, None, None)
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        adapter, self.__adapter = self.__adapter, None
+        await adapter.close()
+
+    def __getattr__(self, name):
+        attr = getattr(self.__toy_cls, name)
+        if not isinstance(attr, FunctionType):
+            return attr
+        if getattr(Toy, name, None) is attr:
+            raise AttributeError(f'{name} is not available on asynchronous toys')
+        method = getattr(attr, '_partialmethod', None)
+        if method is not None and method.func in (Toy._add_listener, Toy._remove_listener):
+            return partial(getattr(self, method.func.__name__), *method.args, **method.keywords)
+        return partial(self.__command, attr)
+
+    def _execute(self, packet, timeout=10.0):
+        raise Captured(packet, timeout)
+
+    async def __command(self, method, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        except Captured as captured:
+            packet, timeout = captured.packet, captured.timeout
+        replay = Replay(self, packet, await self.__send(packet, timeout))
+        while True:
+            try:
+                return replay.run(method, *args, **kwargs)
+            except Awaited as awaited:
+                key, timeout = awaited.key, awaited.timeout
+            future = asyncio.get_event_loop().create_future()
+            self.__waiting[key].append(future)
+            try:
+                replay.notifications.append(await asyncio.wait_for(future, timeout))
+            except asyncio.TimeoutError:
+                waiting = self.__waiting.get(key)
+                if waiting and future in waiting:
+                    waiting.remove(future)
+                raise
+
+    async def __send(self, packet, timeout):
+        if self.__adapter is None:
+            raise RuntimeError('Use toys in async context manager')
+        future = None
+        if packet.response_mode == ResponseModes.ALWAYS:
+            future = asyncio.get_event_loop().create_future()
+            self.__waiting[packet.id].append(future)
+        payload = packet.build()
+        async with self.__write_lock:
+            delay = self.pacer.delay()
+            if delay:
+                await asyncio.sleep(delay)
+            size = self.__write_size
+            for i in range(0, len(payload), size):
+                await self.__adapter.write(self._send_uuid, payload[i:i + size])
+            self.pacer.sent(packet.id)
+        if future is None:
+            return None
+        try:
+            response = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.pacer.timeout(packet.id)
+            waiting = self.__waiting.get(packet.id)
+            if waiting and future in waiting:
+                waiting.remove(future)
+            raise
+        self.pacer.received(packet.id, response.is_busy)
+        return response
+
+    @lazy_property
+    def sensor_control(self) -> AsyncSensorControl:
+        return AsyncSensorControl(self, self.__toy_cls)
+
+    def _add_listener(self, key, listener: Callable):
+        self.__listeners[key[0]][listener] = partial(key[1], listener)
+
+    def _remove_listener(self, key, listener: Callable):
+        self.__listeners[key[0]].pop(listener)
+
+    def listen(self, notify, max_pending: int = 16) -> AsyncIterator:
+        """Iterates over the notifications described by ``notify``, such as
+        :attr:`spherov2.commands.sensor.Sensor.sensor_streaming_data_notify`. Each item is what a listener of that
+        notification would be called with, as a tuple if it takes several arguments. Only the latest
+        ``max_pending`` notifications are kept while the iterating task is busy."""
+        return _iterate(partial(self._add_listener, notify), partial(self._remove_listener, notify), max_pending)
+
+    def __api_read(self, char, data):
+        self._decoder.add(data)
+
+    def __new_packet(self, packet):
+        key = packet.id
+        waiting = self.__waiting.pop(key, None)
+        if waiting:
+            for future in waiting:
+                if not future.done():
+                    future.set_result(packet)
+        else:
+            self._report_error(packet, _call)
+        for f in list(self.__listeners[key].values()):
+            _call(f, packet)
@@ -0,0 +1,119 @@
+from functools import partial
+from typing import Callable, Dict, NamedTuple
+
+from spherov2.controls import ResponseModes
+from spherov2.pacing import Pacer
+
+
+class Captured(Exception):
+    """Raised by ``_execute`` in place of waiting for the response to ``packet``. ``future``, if any, resolves to the
+    response of the packet already queued."""
+
+    def __init__(self, packet, timeout, future=None):
+        super().__init__(packet, timeout, future)
+        self.packet = packet
+        self.timeout = timeout
+        self.future = future
+
+
+class Awaited(Exception):
+    """Raised by :meth:`Replay._wait_packet` for a notification the command has not received yet"""
+
+    def __init__(self, key, timeout):
+        super().__init__(key, timeout)
+        self.key = key
+        self.timeout = timeout
+
+
+class Replay:
+    """Stands in for a toy while a command is run again with the response to its packet and the notifications it
+    waited for, so that it decodes them as it does on a toy waiting for them"""
+
+    def __init__(self, toy, packet, response):
+        self.__toy = toy
+        self.__waited = 0
+        self._packet_manager = self
+        self.packet = packet
+        self.response = response
+        self.notifications = []
+
+    def __getattr__(self, name):
+        return getattr(self.__toy, name)
+
+    def run(self, method: Callable, *args, **kwargs):
+        """Runs ``method``, a function taking the toy first. Raises :class:`Awaited` if the command waits for a
+        notification not in :attr:`notifications` yet."""
+        self.__waited = 0
+        return method(self, *args, **kwargs)
+
+    def new_packet(self, *args, **kwargs):
+        return self.packet
+
+    def _execute(self, packet, timeout=10.0):
+        return self.response
+
+    def _wait_packet(self, key, timeout=10.0, check_error=False):
+        if self.__waited == len(self.notifications):
+            raise Awaited(key, timeout)
+        packet = self.notifications[self.__waited]
+        self.__waited += 1
+        if check_error:
+            packet.check_error()
+        return packet
+
+
+def unbind(command: Callable) -> Callable:
+    """``command``, a method bound to a toy such as ``toy.drive_with_heading``, as a function taking the toy first"""
+    if isinstance(command, partial):
+        method, args, keywords = unbind(command.func), command.args, command.keywords
+        return lambda toy, *a, **kw: method(toy, *args, *a, **{**keywords, **kw})
+    return command.__func__
+
+
+class CommandOptions:
+    """Response modes, error listeners and connection counters, shared by :class:`spherov2.toy.Toy` and
+    :class:`spherov2.aio.AsyncToy`. Packets received from the toy are decoded by ``_decoder`` and handed to
+    ``on_packet``."""
+
+    def __init__(self, toy_cls, on_packet: Callable):
+        self._decoder = toy_cls._packet.Collector(on_packet)
+        self.pacer = Pacer(toy_cls.toy_type.cmd_safe_interval)
+        self.__response_modes = {}
+        self.__error_listeners = set()
+
+    def set_response_mode(self, response_mode: ResponseModes, did: int, cid: int = None):
+        """Sets whether the toy answers command ``cid`` of device ``did``, or every command of that device if
+        ``cid`` is not given. Commands not answered with :attr:`ResponseModes.ALWAYS` return ``None`` right after
+        being queued, and their errors are reported to the error listeners instead of being raised. Commands that
+        return data from the toy always need :attr:`ResponseModes.ALWAYS`."""
+        self.__response_modes[(did, cid)] = response_mode
+
+    def _response_mode(self, did, cid) -> ResponseModes:
+        modes = self.__response_modes
+        if not modes:
+            return ResponseModes.ALWAYS
+        response_mode = modes.get((did, cid))
+        if response_mode is None:
+            response_mode = modes.get((did, None), ResponseModes.ALWAYS)
+        return response_mode
+
+    def add_error_listener(self, listener: Callable):
+        """Calls ``listener`` with every error response to a command that was not waited for"""
+        self.__error_listeners.add(listener)
+
+    def remove_error_listener(self, listener: Callable):
+        self.__error_listeners.remove(listener)
+
+    def _report_error(self, packet, call: Callable) -> bool:
+        """Passes ``packet`` to each error listener through ``call`` if it is an error response. Returns whether it
+        is one."""
+        if not getattr(packet, 'err', None):
+            return False
+        self.pacer.received(packet.id, packet.is_busy)
+        for f in list(self.__error_listeners):
+            call(f, packet)
+        return True
+
+    def stats(self) -> Dict[str, NamedTuple]:
+        """Counters describing the connection with the toy"""
+        return {'decoder': self._decoder.stats, 'pacing': self.pacer.stats}
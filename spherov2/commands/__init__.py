@@ -8,4 +8,4 @@ class Commands:
             raise ValueError(f'Robot type {cls} requires target processor')
         if proc:
             proc = nibble_to_byte(1, proc)
-        return toy._packet_manager.new_packet(cls._did, cid, proc, data)
+        return toy._packet_manager.new_packet(cls._did, cid, proc, data, toy._response_mode(cls._did, cid))
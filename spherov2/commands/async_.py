@@ -1,5 +1,6 @@
 import struct
 
+from spherov2.helper import array_struct
 from spherov2.listeners.async_ import CollisionDetected
 from spherov2.listeners.core import PowerStates
 
@@ -7,7 +8,7 @@ from spherov2.listeners.core import PowerStates
 class Async:
     battery_state_changed_notify = (0xfe, 1), lambda listener, p: listener(PowerStates(p.data[0]))
     sensor_streaming_data_notify = (
-        (0xfe, 3), lambda listener, p: listener(list(struct.unpack('>%dh' % (len(p.data) // 2), p.data))))
+        (0xfe, 3), lambda listener, p: listener(array_struct('h', len(p.data)).unpack(p.data)))
     will_sleep_notify = (0xfe, 5), lambda listener, _: listener()
 
     @staticmethod
@@ -2,7 +2,7 @@ import struct
 from enum import IntEnum
 
 from spherov2.commands import Commands
-from spherov2.helper import to_bytes, to_int
+from spherov2.helper import to_bytes, to_int, array_struct
 from spherov2.listeners.sensor import SensorStreamingMask, CollisionDetected, BotToBotInfraredReadings, \
     RgbcSensorValues, ColorDetection, StreamingServiceData, MotorCurrent, MotorTemperature, \
     MotorThermalProtectionStatus, ThermalProtectionStatus
@@ -40,7 +40,7 @@ class Sensor(Commands):
         return SensorStreamingMask(*struct.unpack('>HBI', toy._execute(Sensor._encode(toy, 1, proc)).data))
 
     sensor_streaming_data_notify = (
-        (24, 2, 0xff), lambda listener, p: listener(list(struct.unpack('>%df' % (len(p.data) // 4), p.data))))
+        (24, 2, 0xff), lambda listener, p: listener(array_struct('f', len(p.data)).unpack(p.data)))
 
     @staticmethod
     def set_extended_sensor_streaming_mask(toy, sensor_masks, proc=None):
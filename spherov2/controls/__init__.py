@@ -1,3 +1,6 @@
+from enum import IntEnum
+from typing import NamedTuple
+
 from spherov2.commands.sphero import RawMotorModes
 
 _ = RawMotorModes
@@ -9,3 +12,15 @@ class PacketDecodingException(Exception):
 
 class CommandExecuteError(Exception):
     ...
+
+
+class ResponseModes(IntEnum):
+    ALWAYS = 0
+    ERRORS_ONLY = 1
+    NEVER = 2
+
+
+class CollectorStats(NamedTuple):
+    packets: int
+    bad_frames: int
+    dropped_bytes: int
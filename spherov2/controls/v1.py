@@ -1,9 +1,9 @@
-import threading
 from enum import IntEnum
-from typing import NamedTuple, Callable, Dict, List
+from functools import lru_cache
+from typing import NamedTuple, Callable, Dict, Tuple, Sequence
 
 from spherov2.commands.sphero import ReverseFlags, RollModes
-from spherov2.controls import PacketDecodingException, CommandExecuteError
+from spherov2.controls import PacketDecodingException, CommandExecuteError, CollectorStats, ResponseModes
 from spherov2.helper import packet_chk, to_bytes
 
 
@@ -12,6 +12,7 @@ class Packet:
 
     SOP = 0xff
     ASYNC = 0xfe
+    NO_ANSWER = 0xfe
 
     class Error(IntEnum):
         command_succeeded = 0x00
@@ -31,12 +32,16 @@ class Packet:
         message_timeout = 0x35
 
     class Request(NamedTuple):
-        """[SOP1, SOP2, DID, CID, SEQ, DLEN, <data>, CHK]"""
+        """[SOP1, SOP2, DID, CID, SEQ, DLEN, <data>, CHK]
+
+        The protocol has no way to ask for error answers only, so requests in
+        :attr:`ResponseModes.ERRORS_ONLY` are answered, and the toy only checks the answers for errors."""
 
         did: int
         cid: int
         seq: int
         data: bytearray
+        response_mode: ResponseModes = ResponseModes.ALWAYS
 
         @property
         def id(self):
@@ -46,9 +51,21 @@ class Packet:
         def dlen(self):
             return len(self.data) + 1
 
+        @staticmethod
+        @lru_cache(None)
+        def __header(sop2, did, cid) -> Tuple[bytes, int]:
+            """Encoded bytes and checksum sum of ``[SOP1, SOP2, DID, CID]``, shared by every request of a command"""
+            return bytes([Packet.SOP, sop2, did, cid]), did + cid
+
         def build(self) -> bytearray:
-            payload = bytearray([Packet.SOP, Packet.SOP, self.did, self.cid, self.seq, self.dlen, *self.data])
-            payload.append(packet_chk(payload[2:]))
+            sop2 = Packet.NO_ANSWER if self.response_mode == ResponseModes.NEVER else Packet.SOP
+            header, header_sum = Packet.Request.__header(sop2, self.did, self.cid)
+            dlen = self.dlen
+            payload = bytearray(header)
+            payload.append(self.seq)
+            payload.append(dlen)
+            payload.extend(self.data)
+            payload.append(0xff - ((header_sum + self.seq + dlen + sum(self.data)) & 0xff))
             return payload
 
     class Response(NamedTuple):
@@ -66,6 +83,18 @@ class Packet:
         def dlen(self):
             return len(self.data) + 1
 
+        @property
+        def err(self) -> 'Packet.Error':
+            return self.mrsp
+
+        @property
+        def is_busy(self) -> bool:
+            return False
+
+        @property
+        def is_response(self) -> bool:
+            return True
+
         def build(self) -> bytearray:
             payload = bytearray([Packet.SOP, Packet.SOP, self.mrsp, self.seq, self.dlen, *self.data])
             payload.append(packet_chk(payload[2:]))
@@ -89,6 +118,10 @@ class Packet:
         def dlen(self):
             return to_bytes(len(self.data) + 1, 2)
 
+        @property
+        def is_response(self) -> bool:
+            return False
+
         def build(self) -> bytearray:
             payload = bytearray([Packet.SOP, Packet.ASYNC, self.id_code, *self.dlen, *self.data])
             payload.append(packet_chk(payload[2:]))
@@ -96,59 +129,80 @@ class Packet:
 
     @staticmethod
     def parse_response(data) -> Response:
-        chk = data.pop()
-        if chk != packet_chk(data):
+        """Parses ``[MRSP, SEQ, DLEN, <data>, CHK]``, which can be any buffer supporting slicing"""
+        if data[-1] != packet_chk(data[:-1]):
             raise PacketDecodingException('Bad response checksum')
-        mrsp, seq, _, *data = data
-        return Packet.Response(Packet.Error(mrsp), seq, bytearray(data))
+        return Packet.Response(Packet.Error(data[0]), data[1], bytearray(data[3:-1]))
 
     @staticmethod
     def parse_async(data) -> Async:
-        chk = data.pop()
-        if chk != packet_chk(data):
+        """Parses ``[ID CODE, DLEN-MSB, DLEN-LSB, <data>, CHK]``, which can be any buffer supporting slicing"""
+        if data[-1] != packet_chk(data[:-1]):
             raise PacketDecodingException('Bad response checksum')
-        id_code, _, _, *data = data
-        return Packet.Async(id_code, bytearray(data))
+        return Packet.Async(data[0], bytearray(data[3:-1]))
 
     class Manager:
         def __init__(self):
             self.__seq = 0
 
-        def new_packet(self, did, cid, _, data=None):
-            packet = Packet.Request(did, cid, self.__seq, bytearray(data or []))
+        def new_packet(self, did, cid, _, data=None, response_mode=ResponseModes.ALWAYS):
+            packet = Packet.Request(did, cid, self.__seq, bytearray(data or b''), response_mode)
             self.__seq = (self.__seq + 1) % 0x100
             return packet
 
     class Collector:
+        """Splits the notification stream into packets. Frames that cannot be decoded are dropped and counted,
+        and decoding resumes at the next start of packet."""
+
+        max_frame_size = 1024
+
         def __init__(self, callback):
             self.__callback = callback
             self.__data = bytearray()
+            self.__packets = self.__bad_frames = self.__dropped_bytes = 0
+
+        @property
+        def stats(self) -> CollectorStats:
+            return CollectorStats(self.__packets, self.__bad_frames, self.__dropped_bytes)
 
         def add(self, data):
-            if not self.__data:
-                while data and data[0] != Packet.SOP:
-                    data.pop(0)
-            self.__data.extend(data)
-            while len(self.__data) > 4:
-                sop1, sop2, *payload = self.__data
-                if sop1 != Packet.SOP:
-                    self.__data.clear()
-                    raise PacketDecodingException('Unexpected start of packet')
-                if sop2 == Packet.SOP:
-                    _, _, dlen, *remain = payload
-                    if dlen > len(remain):
-                        break
-                    self.__callback(Packet.parse_response(payload[:dlen + 3]))
-                    self.__data = remain[dlen:]
-                elif sop2 == Packet.ASYNC:
-                    _, dlen_msb, dlen_lsb, *remain = payload
-                    dlen = (dlen_msb << 8) | dlen_lsb
-                    if dlen > len(remain):
-                        break
-                    self.__callback(Packet.parse_async(payload[:dlen + 3]))
-                    self.__data = remain[dlen:]
-                else:
-                    raise PacketDecodingException('Unexpected start of packet 2')
+            buf = self.__data
+            buf.extend(data)
+            pos = 0
+            try:
+                with memoryview(buf) as view:
+                    while len(buf) - pos > 4:
+                        sop1, sop2 = buf[pos], buf[pos + 1]
+                        if sop1 == Packet.SOP and sop2 == Packet.SOP:
+                            end = pos + 5 + buf[pos + 4]
+                            parse = Packet.parse_response
+                        elif sop1 == Packet.SOP and sop2 == Packet.ASYNC:
+                            end = pos + 5 + ((buf[pos + 3] << 8) | buf[pos + 4])
+                            parse = Packet.parse_async
+                        else:
+                            start = buf.find(Packet.SOP, pos + 1)
+                            if start == -1:
+                                start = len(buf)
+                            self.__dropped_bytes += start - pos
+                            pos = start
+                            continue
+                        if end > len(buf) and end - pos <= self.max_frame_size:
+                            break
+                        with view[pos + 2:end] as payload:
+                            try:
+                                if end > len(buf):
+                                    raise PacketDecodingException('Packet too large')
+                                packet = parse(payload)
+                            except (PacketDecodingException, ValueError):
+                                self.__bad_frames += 1
+                                self.__dropped_bytes += 1
+                                pos += 1
+                                continue
+                        pos = end
+                        self.__packets += 1
+                        self.__callback(packet)
+            finally:
+                del buf[:pos]
 
 
 class DriveControl:
@@ -186,6 +240,7 @@ class SensorControl:
         self.__interval = 250
         self.__enabled = {}
         self.__enabled_extended = {}
+        self.__plan = ()
         self.__listeners = set()
 
     def add_sensor_data_listener(self, listener: Callable[[Dict[str, Dict[str, float]]], None]):
@@ -194,29 +249,17 @@ class SensorControl:
     def remove_sensor_data_listener(self, listener: Callable[[Dict[str, Dict[str, float]]], None]):
         self.__listeners.remove(listener)
 
-    def __sensor_streaming_data(self, sensor_data: List[int]):
+    def __sensor_streaming_data(self, sensor_data: Sequence[int]):
         data = {}
-
-        def __new_data():
-            n = {}
-            for name, component in components.items():
-                d = sensor_data.pop(0)
-                if component.modifier:
-                    d = component.modifier(d)
-                n[name] = d
-            if self.__toy.name.startswith('2B') and sensor in ['locator', 'velocity']:
+        values = iter(sensor_data)
+        for sensor, components, swap_axes in self.__plan:
+            n = {name: next(values) if modifier is None else modifier(next(values)) for name, modifier in components}
+            if swap_axes:
                 n['x'], n['y'] = -n['y'], n['x']
             data[sensor] = n
 
-        for sensor, components in self.__toy.sensors.items():
-            if sensor in self.__enabled:
-                __new_data()
-        for sensor, components in self.__toy.extended_sensors.items():
-            if sensor in self.__enabled_extended:
-                __new_data()
-
         for f in self.__listeners:
-            threading.Thread(target=f, args=(data,)).start()
+            self.__toy.dispatcher.dispatch(f, data)
 
     def set_count(self, count: int):
         if count >= 0 and count != self.__count:
@@ -240,21 +283,36 @@ class SensorControl:
                 extended_sensors_mask |= component.bit
         self.__toy.set_data_streaming(self.__interval, 1, sensors_mask, self.__count, extended_sensors_mask)
 
+    def __compile(self):
+        """Builds the decoding plan for the enabled sensors, in the order their values are streamed"""
+        plan = []
+        swap = self.__toy.name.startswith('2B')
+        for sensors, enabled in ((self.__toy.sensors, self.__enabled),
+                                 (self.__toy.extended_sensors, self.__enabled_extended)):
+            for sensor, components in sensors.items():
+                if sensor in enabled:
+                    plan.append((sensor, tuple((name, c.modifier) for name, c in components.items()),
+                                 swap and sensor in ['locator', 'velocity']))
+        self.__plan = tuple(plan)
+
     def enable(self, *sensors):
         for sensor in sensors:
             if sensor in self.__toy.sensors:
                 self.__enabled[sensor] = self.__toy.sensors[sensor]
             elif sensor in self.__toy.extended_sensors:
                 self.__enabled_extended[sensor] = self.__toy.extended_sensors[sensor]
+        self.__compile()
         self.__update()
 
     def disable(self, *sensors):
         for sensor in sensors:
             self.__enabled.pop(sensor, None)
             self.__enabled_extended.pop(sensor, None)
+        self.__compile()
         self.__update()
 
     def disable_all(self):
         self.__enabled.clear()
         self.__enabled_extended.clear()
+        self.__compile()
         self.__update()
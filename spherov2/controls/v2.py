@@ -1,13 +1,15 @@
-import threading
+import struct
 from collections import OrderedDict, defaultdict
 from enum import IntEnum, Enum, auto, IntFlag
-from typing import Dict, List, Callable, NamedTuple, Tuple
+from functools import lru_cache
+from typing import Dict, Callable, NamedTuple, Tuple, Sequence
 
 from spherov2.commands.drive import DriveFlags
 from spherov2.commands.drive import RawMotorModes as DriveRawMotorModes
 from spherov2.commands.io import IO
-from spherov2.controls import RawMotorModes, PacketDecodingException, CommandExecuteError
-from spherov2.helper import to_bytes, to_int, packet_chk
+from spherov2.controls import RawMotorModes, PacketDecodingException, CommandExecuteError, CollectorStats, \
+    ResponseModes
+from spherov2.helper import to_bytes, packet_chk
 from spherov2.listeners.sensor import StreamingServiceData
 
 
@@ -56,122 +58,250 @@ class Packet(NamedTuple):
         target_unavailable = 0x0a
 
     @staticmethod
-    def parse_response(data) -> 'Packet':
-        sop, *data, eop = data
-        if sop != Packet.Encoding.start:
+    def parse_response(data) -> 'Packet.Response':
+        if data[0] != Packet.Encoding.start:
             raise PacketDecodingException('Unexpected start of packet')
-        if eop != Packet.Encoding.end:
+        if data[-1] != Packet.Encoding.end:
             raise PacketDecodingException('Unexpected end of packet')
-        *data, chk = Packet.__unescape_data(data)
-        if packet_chk(data) != chk:
+        data = Packet.__unescape_data(data[1:-1])
+        if packet_chk(data[:-1]) != data[-1]:
             raise PacketDecodingException('Bad response checksum')
-
-        flags = data.pop(0)
-
-        tid = None
-        if flags & Packet.Flags.has_target_id:
-            tid = data.pop(0)
-
-        sid = None
-        if flags & Packet.Flags.has_source_id:
-            sid = data.pop(0)
-
-        did, cid, seq, *data = data
-
-        err = Packet.Error.success
-        if flags & Packet.Flags.is_response:
-            err = Packet.Error(data.pop(0))
-
-        return Packet(flags, did, cid, seq, tid, sid, bytearray(data), err)
+        flags = data[0]
+        err_offset = 4 + (flags & _has_target_id != 0) + (flags & _has_source_id != 0)
+        is_response = flags & _is_response
+        if len(data) < err_offset + is_response + 1:
+            raise PacketDecodingException('Packet too short for its flags')
+        if is_response and data[err_offset] not in _errors:
+            raise PacketDecodingException(f'Unknown error code {data[err_offset]}')
+        return Packet.Response(data)
 
     @staticmethod
-    def __unescape_data(response_data) -> List[int]:
-        raw_data = []
-
-        iter_response_data = iter(response_data)
-        for b in iter_response_data:
-            if b == Packet.Encoding.escape:
-                b = next(iter_response_data, None)
-                if b == Packet.Encoding.escaped_escape:
-                    b = Packet.Encoding.escape
-                elif b == Packet.Encoding.escaped_start:
-                    b = Packet.Encoding.start
-                elif b == Packet.Encoding.escaped_end:
-                    b = Packet.Encoding.end
-                else:
-                    raise PacketDecodingException('Unexpected escaping byte')
-
-            raw_data.append(b)
+    def __unescape_data(response_data) -> bytes:
+        raw_data = bytes(response_data)
+        if _escape not in raw_data:
+            return raw_data
+        if raw_data.count(_escape) != sum(raw_data.count(e) for e, _ in _escape_sequences):
+            raise PacketDecodingException('Unexpected escaping byte')
+        for escaped, raw in reversed(_escape_sequences):
+            raw_data = raw_data.replace(escaped, raw)
+        return raw_data
 
+    @staticmethod
+    def __escape_data(raw_data) -> bytes:
+        if len(raw_data.translate(None, _specials)) != len(raw_data):
+            for escaped, raw in _escape_sequences:
+                raw_data = raw_data.replace(raw, escaped)
         return raw_data
 
     @property
     def id(self) -> Tuple:
         return self.did, self.cid, self.seq
 
-    def build(self) -> bytearray:
-        packet = bytearray([self.flags])
-
-        if self.flags & Packet.Flags.has_target_id:
-            packet.append(self.tid)
+    @property
+    def response_mode(self) -> ResponseModes:
+        if self.flags & Packet.Flags.requests_response:
+            return ResponseModes.ALWAYS
+        if self.flags & Packet.Flags.requests_only_error_response:
+            return ResponseModes.ERRORS_ONLY
+        return ResponseModes.NEVER
 
-        if self.flags & Packet.Flags.has_source_id:
-            packet.append(self.sid)
+    @staticmethod
+    @lru_cache(None)
+    def __header(flags, tid, sid, did, cid) -> Tuple[bytes, int, bool]:
+        """Escaped ``[SOP, FLAGS, TID, SID, DID, CID]``, its checksum sum and whether ERR follows SEQ, shared by
+        every packet of a command"""
+        header = bytearray([flags])
+        if flags & Packet.Flags.has_target_id:
+            header.append(tid)
+        if flags & Packet.Flags.has_source_id:
+            header.append(sid)
+        header.extend((did, cid))
+        return _start + Packet.__escape_data(bytes(header)), sum(header), bool(flags & Packet.Flags.is_response)
 
-        packet.extend(self.id)
+    def build(self) -> bytearray:
+        header, header_sum, is_response = Packet.__header(self.flags, self.tid, self.sid, self.did, self.cid)
 
-        if self.flags & Packet.Flags.is_response:
+        packet = bytearray([self.seq])
+        if is_response:
             packet.append(self.err)
-
         packet.extend(self.data)
-        packet.append(packet_chk(packet))
-
-        escaped_packet = bytearray([Packet.Encoding.start])
-        for c in packet:
-            if c == Packet.Encoding.escape:
-                escaped_packet.extend((Packet.Encoding.escape, Packet.Encoding.escaped_escape))
-            elif c == Packet.Encoding.start:
-                escaped_packet.extend((Packet.Encoding.escape, Packet.Encoding.escaped_start))
-            elif c == Packet.Encoding.end:
-                escaped_packet.extend((Packet.Encoding.escape, Packet.Encoding.escaped_end))
-            else:
-                escaped_packet.append(c)
-        escaped_packet.append(Packet.Encoding.end)
+        packet.append(0xff - ((header_sum + sum(packet)) & 0xff))
 
+        escaped_packet = bytearray(header)
+        escaped_packet.extend(Packet.__escape_data(packet))
+        escaped_packet.extend(_end)
         return escaped_packet
 
     def check_error(self):
         if self.err != Packet.Error.success:
             raise CommandExecuteError(self.err)
 
+    class Response:
+        """Packet received from the toy, kept as its unescaped frame ``[FLAGS, TID (optional), SID (optional), DID,
+        CID, SEQ, ERR (at response), DATA..., CHK]`` with fields decoded on access"""
+
+        __slots__ = ('__frame', '__data')
+
+        def __init__(self, frame: bytes):
+            self.__frame = frame
+            self.__data = None
+
+        @property
+        def __did_offset(self) -> int:
+            flags = self.__frame[0]
+            return 1 + (flags & _has_target_id != 0) + (flags & _has_source_id != 0)
+
+        @property
+        def flags(self) -> int:
+            return self.__frame[0]
+
+        @property
+        def tid(self):
+            return self.__frame[1] if self.__frame[0] & _has_target_id else None
+
+        @property
+        def sid(self):
+            flags = self.__frame[0]
+            if flags & _has_source_id:
+                return self.__frame[2 if flags & _has_target_id else 1]
+            return None
+
+        @property
+        def did(self) -> int:
+            return self.__frame[self.__did_offset]
+
+        @property
+        def cid(self) -> int:
+            return self.__frame[self.__did_offset + 1]
+
+        @property
+        def seq(self) -> int:
+            return self.__frame[self.__did_offset + 2]
+
+        @property
+        def id(self) -> Tuple:
+            offset = self.__did_offset
+            return tuple(self.__frame[offset:offset + 3])
+
+        @property
+        def err(self) -> 'Packet.Error':
+            if self.__frame[0] & _is_response:
+                return Packet.Error(self.__frame[self.__did_offset + 3])
+            return Packet.Error.success
+
+        @property
+        def is_busy(self) -> bool:
+            return self.err == Packet.Error.busy
+
+        @property
+        def is_response(self) -> bool:
+            return self.__frame[0] & _is_response != 0
+
+        @property
+        def data(self) -> bytearray:
+            if self.__data is None:
+                start = self.__did_offset + 3 + (self.__frame[0] & _is_response)
+                with memoryview(self.__frame) as frame:
+                    self.__data = bytearray(frame[start:-1])
+            return self.__data
+
+        def to_packet(self) -> 'Packet':
+            return Packet(self.flags, self.did, self.cid, self.seq, self.tid, self.sid, self.data, self.err)
+
+        def build(self) -> bytearray:
+            return self.to_packet().build()
+
+        def check_error(self):
+            if self.err != Packet.Error.success:
+                raise CommandExecuteError(self.err)
+
+        def __repr__(self):
+            return repr(self.to_packet())
+
     class Manager:
         def __init__(self):
             self.__seq = 0
-
-        def new_packet(self, did, cid, tid=None, data=None):
-            flags = Packet.Flags.requests_response | Packet.Flags.is_activity
-            sid = None
-            if tid is not None:
-                flags |= Packet.Flags.has_source_id | Packet.Flags.has_target_id
-                sid = 0x1
-            packet = Packet(flags, did, cid, self.__seq, tid, sid, bytearray(data or []))
+            self.__flags = {
+                ResponseModes.ALWAYS: Packet.Flags.requests_response | Packet.Flags.is_activity,
+                ResponseModes.ERRORS_ONLY: Packet.Flags.requests_only_error_response | Packet.Flags.is_activity,
+                ResponseModes.NEVER: Packet.Flags.is_activity,
+            }
+            self.__target_flags = {mode: flags | Packet.Flags.has_source_id | Packet.Flags.has_target_id
+                                   for mode, flags in self.__flags.items()}
+
+        def new_packet(self, did, cid, tid=None, data=None, response_mode=ResponseModes.ALWAYS):
+            if tid is None:
+                packet = Packet(self.__flags[response_mode], did, cid, self.__seq, None, None, bytearray(data or b''))
+            else:
+                packet = Packet(self.__target_flags[response_mode], did, cid, self.__seq, tid, 0x1,
+                                bytearray(data or b''))
             self.__seq = (self.__seq + 1) % 0xff
             return packet
 
     class Collector:
+        """Splits the notification stream into packets. Frames that cannot be decoded are dropped and counted,
+        and decoding resumes at the next start of packet."""
+
+        max_frame_size = 1024
+
         def __init__(self, callback):
             self.__callback = callback
-            self.__data = []
+            self.__data = bytearray()
+            self.__packets = self.__bad_frames = self.__dropped_bytes = 0
+
+        @property
+        def stats(self) -> CollectorStats:
+            return CollectorStats(self.__packets, self.__bad_frames, self.__dropped_bytes)
 
         def add(self, data):
-            for b in data:
-                self.__data.append(b)
-                if b == Packet.Encoding.end:
-                    pkt = self.__data
-                    self.__data = []
-                    if len(pkt) < 6:
-                        raise PacketDecodingException(f'Very small packet {[hex(x) for x in pkt]}')
-                    self.__callback(Packet.parse_response(pkt))
+            buf = self.__data
+            buf.extend(data)
+            end = buf.find(Packet.Encoding.end, len(buf) - len(data))
+            begin = 0
+            try:
+                with memoryview(buf) as view:
+                    while end != -1:
+                        start = buf.rfind(Packet.Encoding.start, begin, end)
+                        if start == -1:
+                            start = end
+                        self.__dropped_bytes += start - begin
+                        begin = end + 1
+                        with view[start:begin] as pkt:
+                            try:
+                                if len(pkt) < 6:
+                                    raise PacketDecodingException(f'Very small packet {[hex(x) for x in pkt]}')
+                                packet = Packet.parse_response(pkt)
+                            except PacketDecodingException:
+                                packet = None
+                                self.__bad_frames += 1
+                                self.__dropped_bytes += len(pkt)
+                        if packet is not None:
+                            self.__packets += 1
+                            self.__callback(packet)
+                        end = buf.find(Packet.Encoding.end, begin)
+                start = buf.rfind(Packet.Encoding.start, begin)
+                if start == -1 or len(buf) - start > self.max_frame_size:
+                    start = len(buf)
+                self.__dropped_bytes += start - begin
+                begin = start
+            finally:
+                del buf[:begin]
+
+
+_is_response = int(Packet.Flags.is_response)
+_has_target_id = int(Packet.Flags.has_target_id)
+_has_source_id = int(Packet.Flags.has_source_id)
+_errors = frozenset(Packet.Error)
+_start = bytes([Packet.Encoding.start])
+_end = bytes([Packet.Encoding.end])
+_escape = bytes([Packet.Encoding.escape])
+_specials = _escape + _start + _end
+# (escaped, raw) pairs, the escape byte itself must be substituted first when escaping and last when unescaping
+_escape_sequences = (
+    (bytes([Packet.Encoding.escape, Packet.Encoding.escaped_escape]), _escape),
+    (bytes([Packet.Encoding.escape, Packet.Encoding.escaped_start]), _start),
+    (bytes([Packet.Encoding.escape, Packet.Encoding.escaped_end]), _end),
+)
 
 
 class DriveControl:
@@ -218,24 +348,43 @@ class DriveControl:
         self.__toy.reset_yaw()
 
 
+class LedPlan(NamedTuple):
+    mask: int
+    order: Tuple[int, ...]
+
+
 class LedControl:
     def __init__(self, toy):
-        self.__toy = toy
+        self.__leds = frozenset(toy.LEDs)
+        if toy.implements(IO.set_all_leds_with_32_bit_mask):
+            self.__set_all_leds = toy.set_all_leds_with_32_bit_mask
+        elif toy.implements(IO.set_all_leds_with_16_bit_mask):
+            self.__set_all_leds = toy.set_all_leds_with_16_bit_mask
+        elif hasattr(toy, 'set_all_leds_with_8_bit_mask'):
+            self.__set_all_leds = toy.set_all_leds_with_8_bit_mask
+        else:
+            self.__set_all_leds = None
+
+    @staticmethod
+    def compile(layout: Dict[IntEnum, int]) -> LedPlan:
+        """Compiles a group of LEDs, where ``layout`` maps each LED to the index of the value it takes, into the mask
+        of the group and the indexes of the values in the order the LED commands take them"""
+        leds = sorted(layout)
+        return LedPlan(sum(1 << led for led in leds), tuple(layout[led] for led in leds))
+
+    def apply(self, plan: LedPlan, values: Sequence[int]):
+        """Sets the LEDs of a compiled group to ``values``"""
+        if plan.mask and self.__set_all_leds is not None:
+            self.__set_all_leds(plan.mask, [values[i] for i in plan.order])
 
     def set_leds(self, mapping: Dict[IntEnum, int]):
         mask = 0
         led_values = []
-        for e in self.__toy.LEDs:
-            if e in mapping:
-                mask |= 1 << e
-                led_values.append(mapping[e])
-        if mask:
-            if self.__toy.implements(IO.set_all_leds_with_32_bit_mask):
-                self.__toy.set_all_leds_with_32_bit_mask(mask, led_values)
-            elif self.__toy.implements(IO.set_all_leds_with_16_bit_mask):
-                self.__toy.set_all_leds_with_16_bit_mask(mask, led_values)
-            elif hasattr(self.__toy, 'set_all_leds_with_8_bit_mask'):
-                self.__toy.set_all_leds_with_8_bit_mask(mask, led_values)
+        for e in sorted(e for e in mapping if e in self.__leds):
+            mask |= 1 << e
+            led_values.append(mapping[e])
+        if mask and self.__set_all_leds is not None:
+            self.__set_all_leds(mask, led_values)
 
 
 class SensorControl:
@@ -247,29 +396,18 @@ class SensorControl:
         self.__interval = 250
         self.__enabled = {}
         self.__enabled_extended = {}
+        self.__plan = ()
         self.__listeners = set()
 
-    def __process_sensor_stream_data(self, sensor_data: List[float]):
+    def __process_sensor_stream_data(self, sensor_data: Sequence[float]):
         data = {}
-
-        def __new_data():
-            n = {}
-            for name, component in components.items():
-                d = sensor_data.pop(0)
-                if component.modifier:
-                    d = component.modifier(d)
-                n[name] = d
-            data[sensor] = n
-
-        for sensor, components in self.__toy.sensors.items():
-            if sensor in self.__enabled:
-                __new_data()
-        for sensor, components in self.__toy.extended_sensors.items():
-            if sensor in self.__enabled_extended:
-                __new_data()
+        values = iter(sensor_data)
+        for sensor, components in self.__plan:
+            data[sensor] = {name: next(values) if modifier is None else modifier(next(values))
+                            for name, modifier in components}
 
         for f in self.__listeners:
-            threading.Thread(target=f, args=(data,)).start()
+            self.__toy.dispatcher.dispatch(f, data)
 
     def add_sensor_data_listener(self, listener: Callable[[Dict[str, Dict[str, float]]], None]):
         self.__listeners.add(listener)
@@ -299,23 +437,36 @@ class SensorControl:
         self.__toy.set_extended_sensor_streaming_mask(extended_sensors_mask)
         self.__toy.set_sensor_streaming_mask(self.__interval, self.__count, sensors_mask)
 
+    def __compile(self):
+        """Builds the decoding plan for the enabled sensors, in the order their values are streamed"""
+        plan = []
+        for sensors, enabled in ((self.__toy.sensors, self.__enabled),
+                                 (self.__toy.extended_sensors, self.__enabled_extended)):
+            for sensor, components in sensors.items():
+                if sensor in enabled:
+                    plan.append((sensor, tuple((name, c.modifier) for name, c in components.items())))
+        self.__plan = tuple(plan)
+
     def enable(self, *sensors):
         for sensor in sensors:
             if sensor in self.__toy.sensors:
                 self.__enabled[sensor] = self.__toy.sensors[sensor]
             elif sensor in self.__toy.extended_sensors:
                 self.__enabled_extended[sensor] = self.__toy.extended_sensors[sensor]
+        self.__compile()
         self.__update()
 
     def disable(self, *sensors):
         for sensor in sensors:
             self.__enabled.pop(sensor, None)
             self.__enabled_extended.pop(sensor, None)
+        self.__compile()
         self.__update()
 
     def disable_all(self):
         self.__enabled.clear()
         self.__enabled_extended.clear()
+        self.__compile()
         self.__update()
 
 
@@ -344,6 +495,13 @@ class StreamingService(NamedTuple):
     data_size: StreamingDataSizes = StreamingDataSizes.ThirtyTwoBit
 
 
+_streaming_data_formats = {
+    StreamingDataSizes.EightBit: 'B',
+    StreamingDataSizes.SixteenBit: 'H',
+    StreamingDataSizes.ThirtyTwoBit: 'I'
+}
+
+
 class StreamingServiceState(Enum):
     Unknown = auto()
     Stop = auto()
@@ -400,9 +558,9 @@ class StreamingControl:
     def __init__(self, toy):
         toy.add_streaming_service_data_notify_listener(self.__streaming_service_data)
         self.__toy = toy
-        self.__slots = {
-            Processors.PRIMARY: defaultdict(list),
-            Processors.SECONDARY: defaultdict(list)
+        self.__plans = {
+            Processors.PRIMARY: {},
+            Processors.SECONDARY: {}
         }
         self.__enabled = set()
         self.__listeners = set()
@@ -455,11 +613,11 @@ class StreamingControl:
                 self.__toy.clear_streaming_service(target)
             elif state == StreamingServiceState.Start:
                 self.__toy.clear_streaming_service(target)
-                slots = self.__slots[target]
-                slots.clear()
+                slots = defaultdict(list)
                 for index, (s, sensor) in enumerate(self.__streaming_services.items()):
                     if s in self.__enabled and sensor.processor == target:
                         slots[sensor.slot].append((index, s, sensor))
+                self.__plans[target] = {slot: self.__compile(slot, services) for slot, services in slots.items()}
                 if slots:
                     for slot, services in slots.items():
                         data = []
@@ -471,24 +629,33 @@ class StreamingControl:
             elif state == StreamingServiceState.Restart:
                 self.__toy.start_streaming_service(self.__interval, target)
 
-    def __streaming_service_data(self, source_id, data: StreamingServiceData):
-        node = data.token & 0xf
-        processor = source_id & 0xf
-        sensor_data = data.sensor_data
-        services = self.__slots[processor][node]
-        data = {}
+    @staticmethod
+    def __compile(slot, services):
+        """Builds the decoding plan of a slot: a single struct for all of its values, and the scale, offset and
+        modifier to apply to each of them"""
+        fmt = '>'
+        plan = []
         for _, sensor_name, sensor in services:
-            n = {}
-            for name, component in sensor.attributes.items():
-                data_size = 1 << sensor.data_size
-                value, sensor_data = to_int(sensor_data[:data_size]), sensor_data[data_size:]
-                value = value / ((1 << data_size * 8) - 1) * (
-                        component.max_value - component.min_value) + component.min_value
-                if component.modifier is not None:
-                    value = component.modifier(value)
-                n[name] = value
-            if sensor_name == 'color_detection' and node != 0:
-                continue
-            data[sensor_name] = n
+            data_size = 1 << sensor.data_size
+            scale = 1 / ((1 << data_size * 8) - 1)
+            fmt += _streaming_data_formats[sensor.data_size] * len(sensor.attributes)
+            plan.append((sensor_name, sensor_name != 'color_detection' or slot == 0, tuple(
+                (name, (component.max_value - component.min_value) * scale, component.min_value, component.modifier)
+                for name, component in sensor.attributes.items())))
+        return struct.Struct(fmt), tuple(plan)
+
+    def __streaming_service_data(self, source_id, data: StreamingServiceData):
+        plan = self.__plans[source_id & 0xf].get(data.token & 0xf)
+        result = {}
+        if plan is not None:
+            values_struct, services = plan
+            values = iter(values_struct.unpack_from(data.sensor_data))
+            for sensor_name, keep, attributes in services:
+                n = {}
+                for name, scale, offset, modifier in attributes:
+                    value = next(values) * scale + offset
+                    n[name] = value if modifier is None else modifier(value)
+                if keep:
+                    result[sensor_name] = n
         for f in self.__listeners:
-            threading.Thread(target=f, args=(data,)).start()
+            self.__toy.dispatcher.dispatch(f, result)
@@ -0,0 +1,111 @@
+import threading
+import traceback
+from collections import deque
+from concurrent import futures
+from enum import IntEnum
+from typing import NamedTuple, Callable
+
+
+class DropPolicies(IntEnum):
+    DROP_OLDEST = 0
+    DROP_NEWEST = 1
+
+
+class DispatcherStats(NamedTuple):
+    dispatched: int
+    dropped: int
+    pending: int
+
+
+class Dispatcher:
+    """Calls listeners on a shared pool of ``max_workers`` threads.
+
+    The events of a listener wait in its own queue and are handled in order, one at a time. When a listener falls
+    behind by more than ``max_pending`` events, the oldest or the newest one is dropped according to
+    ``drop_policy``; with ``max_pending=1`` and :attr:`DropPolicies.DROP_OLDEST` a slow listener only ever gets the
+    latest event.
+
+    :meth:`view` gives a dispatcher sharing the workers of this one, with its own queues and counters, such as the one
+    of each toy. The events dispatched through a view are also counted by the dispatcher it was taken from."""
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 16,
+                 drop_policy: DropPolicies = DropPolicies.DROP_OLDEST):
+        if max_pending < 1:
+            raise ValueError('Listeners must be allowed at least one pending event')
+        self.max_pending = max_pending
+        self.drop_policy = drop_policy
+        self.__executor = futures.ThreadPoolExecutor(max_workers, 'spherov2-dispatch')
+        self.__lock = threading.Lock()
+        self.__queues = {}
+        self.__dispatched = self.__dropped = self.__pending = 0
+        self.__parent = None
+
+    def view(self) -> 'Dispatcher':
+        view = Dispatcher.__new__(Dispatcher)
+        view.max_pending = self.max_pending
+        view.drop_policy = self.drop_policy
+        view.__executor = self.__executor
+        view.__lock = self.__lock
+        view.__queues = {}
+        view.__dispatched = view.__dropped = view.__pending = 0
+        view.__parent = self
+        return view
+
+    @property
+    def stats(self) -> DispatcherStats:
+        with self.__lock:
+            return DispatcherStats(self.__dispatched, self.__dropped, self.__pending)
+
+    def __count(self, dispatched=0, dropped=0, pending=0):
+        dispatcher = self
+        while dispatcher is not None:
+            dispatcher.__dispatched += dispatched
+            dispatcher.__dropped += dropped
+            dispatcher.__pending += pending
+            dispatcher = dispatcher.__parent
+
+    def dispatch(self, listener: Callable, *args):
+        with self.__lock:
+            queue = self.__queues.get(listener)
+            if queue is None:
+                queue = self.__queues[listener] = deque()
+                self.__executor.submit(self.__run, listener)
+            elif len(queue) >= self.max_pending:
+                if self.drop_policy == DropPolicies.DROP_NEWEST:
+                    self.__count(dropped=1)
+                    return
+                queue.popleft()
+                queue.append(args)
+                self.__count(dispatched=1, dropped=1)
+                return
+            queue.append(args)
+            self.__count(dispatched=1, pending=1)
+
+    def __run(self, listener):
+        """Handles the next event of ``listener``, and resubmits itself while more are pending so that busy listeners
+        take turns with the others"""
+        with self.__lock:
+            args = self.__queues[listener].popleft()
+            self.__count(pending=-1)
+        try:
+            listener(*args)
+        except Exception:
+            traceback.print_exc()
+        with self.__lock:
+            if self.__queues[listener]:
+                self.__executor.submit(self.__run, listener)
+            else:
+                del self.__queues[listener]
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_dispatcher() -> Dispatcher:
+    """The dispatcher used by every toy unless given its own"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = Dispatcher()
+        return _shared
@@ -1,3 +1,5 @@
+import struct
+import threading
 from functools import lru_cache
 
 from spherov2.types import Color
@@ -16,6 +18,12 @@ def nibble_to_byte(high, low):
     return (high << 4) | low
 
 
+@lru_cache(None)
+def array_struct(code: str, size: int) -> struct.Struct:
+    """Big-endian :class:`struct.Struct` of as many ``code`` items as fit in ``size`` bytes."""
+    return struct.Struct('>%d%s' % (size // struct.calcsize(code), code))
+
+
 def bound_value(lower, value, upper):
     return min(upper, max(lower, value))
 
@@ -30,3 +38,33 @@ def bound_color(color: Color, default_color: Color):
 
 def packet_chk(payload):
     return 0xff - (sum(payload) & 0xff)
+
+
+def max_write_size(adapter) -> int:
+    """Largest write the adapter can make in one go: the ATT MTU it reports minus the 3 bytes of the ATT header, and
+    never less than the 20 bytes every BLE link allows"""
+    return max(20, getattr(adapter, 'mtu', 23) - 3)
+
+
+class lazy_property:
+    """Property computed on first access and stored on the instance, as ``functools.cached_property`` does from Python
+    3.8. Unlike a property over ``lru_cache``, it does not keep the instance alive once it is no longer used."""
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+        self.__lock = threading.Lock()
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        with self.__lock:
+            try:
+                return instance.__dict__[self.name]
+            except KeyError:
+                value = instance.__dict__[self.name] = self.func(instance)
+                return value
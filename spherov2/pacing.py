@@ -0,0 +1,102 @@
+import threading
+import time
+from typing import NamedTuple, Hashable, Optional
+
+
+class PacingStats(NamedTuple):
+    interval: float
+    commands_per_second: float
+    latency: float
+    busy: int
+    timeouts: int
+
+
+class Pacer:
+    """Spaces the packets written to a toy, adapting the command rate with additive increase and multiplicative
+    decrease (AIMD).
+
+    The rate grows by ``increase`` commands per second whenever a response arrives within ``latency_tolerance``
+    times the lowest latency measured so far, and is multiplied by ``decrease`` whenever the toy reports it is busy
+    or a command times out. The interval between two writes is kept between ``min_interval`` and ``max_interval``.
+
+    :param interval: Initial interval between two writes, in seconds, usually ``toy_type.cmd_safe_interval``.
+    """
+
+    smoothing = .125
+
+    def __init__(self, interval: float, min_interval: float = None, max_interval: float = None,
+                 increase: float = .5, decrease: float = .5, latency_tolerance: float = 4.):
+        self.min_interval = interval / 4 if min_interval is None else min_interval
+        self.max_interval = interval * 8 if max_interval is None else max_interval
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+
+        self.__lock = threading.Lock()
+        self.__interval = interval
+        self.__next = 0.
+        self.__last_sent = None
+        self.__send_period = interval
+        self.__sent = {}
+        self.__base_latency = None
+        self.__latency = 0.
+        self.__busy = self.__timeouts = 0
+
+    @property
+    def interval(self) -> float:
+        return self.__interval
+
+    @property
+    def stats(self) -> PacingStats:
+        return PacingStats(self.__interval, 1 / self.__send_period if self.__send_period else 0., self.__latency,
+                           self.__busy, self.__timeouts)
+
+    def delay(self) -> float:
+        """Seconds left before the next packet may be written"""
+        return max(0., self.__next - time.monotonic())
+
+    def wait(self):
+        """Blocks until the next packet may be written"""
+        delay = self.delay()
+        if delay:
+            time.sleep(delay)
+
+    def sent(self, key: Hashable = None):
+        """Records that the packet identified by ``key`` has been written"""
+        now = time.monotonic()
+        if self.__last_sent is not None:
+            self.__send_period += (now - self.__last_sent - self.__send_period) * self.smoothing
+        self.__last_sent = now
+        self.__next = now + self.__interval
+        if key is not None:
+            self.__sent[key] = now
+
+    def received(self, key: Hashable, busy: bool = False) -> Optional[float]:
+        """Records the response to the packet identified by ``key``, and returns its latency if the packet was
+        written"""
+        sent = self.__sent.pop(key, None)
+        if sent is None:
+            return None
+        latency = time.monotonic() - sent
+        with self.__lock:
+            if self.__base_latency is None:
+                self.__base_latency = self.__latency = latency
+            else:
+                self.__base_latency = min(self.__base_latency, latency)
+                self.__latency += (latency - self.__latency) * self.smoothing
+            if busy:
+                self.__busy += 1
+                self.__slow_down()
+            elif latency <= self.__base_latency * self.latency_tolerance:
+                self.__interval = max(self.min_interval, 1 / (1 / self.__interval + self.increase))
+        return latency
+
+    def timeout(self, key: Hashable):
+        """Records that no response arrived in time for the packet identified by ``key``"""
+        self.__sent.pop(key, None)
+        with self.__lock:
+            self.__timeouts += 1
+            self.__slow_down()
+
+    def __slow_down(self):
+        self.__interval = min(self.max_interval, self.__interval / self.decrease)
@@ -0,0 +1,138 @@
+import threading
+import time
+from concurrent import futures
+from typing import NamedTuple, Tuple, Optional
+
+
+class PendingStats(NamedTuple):
+    pending: int
+    expired: int
+    late: int
+    oldest_age: float
+
+
+class PendingRequests:
+    """Fixed-size table of the requests waiting for their responses, indexed by the sequence number ending their id.
+
+    A request whose waiter timed out stays in the table as expired until its sequence number is reused, so that a
+    response arriving after the deadline is recognised as late and dropped instead of being handed to a newer request.
+    Ids not ending with a sequence number of a pending request, such as those of notifications, are not matched.
+
+    With a ``limit``, a new request waits until fewer than ``limit`` requests are pending before taking a slot."""
+
+    def __init__(self, size: int = 0x100, limit: int = 0):
+        self.limit = limit
+        self.__lock = threading.Condition(threading.Lock())
+        self.__slots = [None] * size
+        self.__pending = self.__expired = self.__late = 0
+
+    @property
+    def stats(self) -> PendingStats:
+        now = time.monotonic()
+        with self.__lock:
+            started = [slot[2] for slot in self.__slots if slot is not None and not slot[4]]
+            return PendingStats(self.__pending, self.__expired, self.__late, now - min(started) if started else 0.)
+
+    def add(self, key: Tuple, timeout: float) -> futures.Future:
+        """Registers a waiter for the response to the request ``key``, which expires after ``timeout`` seconds.
+        Raises :class:`concurrent.futures.TimeoutError` if no slot frees up within ``timeout`` seconds."""
+        future = futures.Future()
+        now = time.monotonic()
+        with self.__lock:
+            slot = self.__slots[key[-1]]
+            if slot is not None and slot[0] == key and not slot[4]:
+                slot[1].append(future)
+                slot[3] = max(slot[3], now + timeout)
+                return future
+            if self.limit and not self.__lock.wait_for(lambda: self.__pending < self.limit, timeout):
+                raise futures.TimeoutError
+            now = time.monotonic()
+            slot = self.__slots[key[-1]]
+            if slot is not None and not slot[4]:
+                self.__pending -= 1
+                self.__expired += 1
+                stale = slot[1]
+            else:
+                stale = ()
+            self.__slots[key[-1]] = [key, [future], now, now + timeout, False]
+            self.__pending += 1
+        _fail(stale)
+        return future
+
+    def expire(self, key: Tuple):
+        """Gives up waiting for the response to the request ``key``"""
+        with self.__lock:
+            slot = self.__slots[key[-1]]
+            if slot is None or slot[0] != key or slot[4]:
+                return
+            slot[4] = True
+            self.__pending -= 1
+            self.__expired += 1
+            self.__lock.notify()
+        _fail(slot[1])
+
+    def fail(self, key: Tuple, exception: BaseException):
+        """Fails the waiters of the request ``key``, which did not reach the toy, with ``exception``"""
+        with self.__lock:
+            slot = self.__slots[key[-1]]
+            if slot is None or slot[0] != key or slot[4]:
+                return
+            self.__slots[key[-1]] = None
+            self.__pending -= 1
+            self.__lock.notify()
+        for future in slot[1]:
+            if not future.done():
+                future.set_exception(exception)
+
+    def sweep(self):
+        """Expires every request past its deadline"""
+        now = time.monotonic()
+        for slot in self.__slots:
+            if slot is not None and not slot[4] and slot[3] < now:
+                self.expire(slot[0])
+
+    def resolve(self, packet) -> bool:
+        """Hands ``packet`` to the waiters of the request it answers. Returns whether it answers a request, including
+        one that already expired."""
+        key = packet.id
+        if key[-1] >= len(self.__slots):
+            return False
+        with self.__lock:
+            slot = self.__slots[key[-1]]
+            if slot is None or slot[0] != key:
+                return False
+            self.__slots[key[-1]] = None
+            if slot[4]:
+                self.__late += 1
+                return True
+            self.__pending -= 1
+            self.__lock.notify()
+        for future in slot[1]:
+            if not future.done():
+                future.set_result(packet)
+        return True
+
+    def transfer(self, key: Tuple, new_key: Optional[Tuple]):
+        """Moves the waiters of the request ``key`` to the request ``new_key`` superseding it, or resolves them with
+        ``None`` if nothing waits for the new request or ``new_key`` is ``None``"""
+        with self.__lock:
+            slot = self.__slots[key[-1]]
+            if slot is None or slot[0] != key or slot[4]:
+                return
+            self.__slots[key[-1]] = None
+            self.__pending -= 1
+            self.__lock.notify()
+            new_slot = None if new_key is None else self.__slots[new_key[-1]]
+            if new_slot is not None and new_slot[0] == new_key and not new_slot[4]:
+                new_slot[1].extend(slot[1])
+                new_slot[3] = max(new_slot[3], slot[3])
+                return
+        for future in slot[1]:
+            if not future.done():
+                future.set_result(None)
+
+
+def _fail(waiters):
+    for future in waiters:
+        if not future.done():
+            future.set_exception(futures.TimeoutError())
@@ -0,0 +1,107 @@
+import queue
+import threading
+import time
+from collections import deque
+from enum import IntEnum
+from typing import NamedTuple, Callable, Hashable, Any, Dict
+
+
+class Priorities(IntEnum):
+    SAFETY = 0
+    MOTION = 1
+    CONFIG = 2
+    COSMETIC = 3
+
+
+class WriteQueueStats(NamedTuple):
+    depth: Dict[str, int]
+    coalesced: int
+    flushed: int
+    aged: int
+
+
+class WriteQueue:
+    """Queue of packets waiting to be written to a toy, with one lane per :class:`Priorities` class.
+
+    The first packet of the most urgent non-empty lane is taken first, except that a packet having waited more than
+    ``max_delay`` seconds in a lower lane is taken before the packets of any lane but :attr:`Priorities.SAFETY`.
+    Putting a :attr:`Priorities.SAFETY` packet flushes the unsent :attr:`Priorities.MOTION` packets that have a
+    coalescing key, the drive commands, so no drive queued before a stop can set the toy moving again. Other motion
+    commands, such as animations, are kept.
+
+    An item put with a coalescing key replaces the unsent item with the same key and takes its place in the queue,
+    or moves to the lane of the new item if it is more urgent, so only the latest state set by a burst of commands
+    reaches the toy. ``on_replace`` is called with every replaced item and the item superseding it, or with every
+    flushed item and ``None``, while the queue is locked, before the new item can be taken."""
+
+    def __init__(self, on_replace: Callable[[Any, Any], None] = None, max_delay: float = .5):
+        self.max_delay = max_delay
+        self.__on_replace = on_replace
+        self.__cond = threading.Condition(threading.Lock())
+        self.__lanes = tuple(deque() for _ in Priorities)
+        self.__unsent = {}
+        self.__coalesced = self.__flushed = self.__aged = 0
+
+    @property
+    def stats(self) -> WriteQueueStats:
+        return WriteQueueStats({p.name: len(lane) for p, lane in zip(Priorities, self.__lanes)},
+                               self.__coalesced, self.__flushed, self.__aged)
+
+    def put(self, item, coalescing_key: Hashable = None, priority: Priorities = Priorities.CONFIG):
+        with self.__cond:
+            if priority == Priorities.SAFETY:
+                self.__flush(Priorities.MOTION)
+            if coalescing_key is not None:
+                entry = self.__unsent.get(coalescing_key)
+                if entry is not None:
+                    replaced, entry[1] = entry[1], item
+                    self.__coalesced += 1
+                    if self.__on_replace is not None:
+                        self.__on_replace(replaced, item)
+                    if entry[3] <= priority:
+                        return
+                    self.__lanes[entry[3]].remove(entry)
+                    entry[3] = priority
+                    self.__lanes[priority].append(entry)
+                    self.__cond.notify()
+                    return
+                entry = self.__unsent[coalescing_key] = [coalescing_key, item, time.monotonic(), priority]
+            else:
+                entry = [None, item, time.monotonic(), priority]
+            self.__lanes[priority].append(entry)
+            self.__cond.notify()
+
+    def get(self, timeout: float = None):
+        """Takes the next item, waiting for one up to ``timeout`` seconds or forever if ``timeout`` is ``None``.
+        Raises :class:`queue.Empty` if none came."""
+        with self.__cond:
+            while True:
+                lanes = [lane for lane in self.__lanes if lane]
+                if lanes:
+                    break
+                if not self.__cond.wait(timeout) and timeout is not None:
+                    raise queue.Empty
+            lane = lanes[0]
+            if lane is not self.__lanes[Priorities.SAFETY]:
+                oldest = min(lanes, key=lambda l: l[0][2])
+                if oldest is not lane and time.monotonic() - oldest[0][2] > self.max_delay:
+                    self.__aged += 1
+                    lane = oldest
+            coalescing_key, item, _, _ = lane.popleft()
+            if coalescing_key is not None:
+                del self.__unsent[coalescing_key]
+            return item
+
+    def __flush(self, priority):
+        lane = self.__lanes[priority]
+        kept = [entry for entry in lane if entry[0] is None]
+        if len(kept) == len(lane):
+            return
+        for coalescing_key, replaced, _, _ in lane:
+            if coalescing_key is not None:
+                del self.__unsent[coalescing_key]
+                self.__flushed += 1
+                if self.__on_replace is not None:
+                    self.__on_replace(replaced, None)
+        lane.clear()
+        lane.extend(kept)
@@ -0,0 +1,137 @@
+import json
+import time
+from bisect import bisect_left
+from typing import NamedTuple, Tuple, Dict, Hashable
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10.)
+
+
+class HistogramStats(NamedTuple):
+    bounds: Tuple[float, ...]
+    counts: Tuple[int, ...]
+    sum: float
+    count: int
+
+
+class Histogram:
+    """Counts observations in buckets with fixed upper ``bounds``, and one more bucket for larger values"""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @property
+    def stats(self) -> HistogramStats:
+        return HistogramStats(self.bounds, tuple(self.counts), self.sum, self.count)
+
+
+class TelemetryStats(NamedTuple):
+    uptime: float
+    packets_out: int
+    bytes_out: int
+    bytes_in: int
+    notifications: Dict[str, int]
+    latency: Dict[str, HistogramStats]
+
+
+class Telemetry:
+    """Counters and latency histograms of a toy's traffic.
+
+    Recording takes no lock: counters are plain attributes updated by the single writer or reader thread of the toy,
+    and histograms are allocated the first time a command is seen, so a snapshot taken while traffic flows may be
+    off by the observations in progress."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.__started = time.monotonic()
+        self.__packets_out = self.__bytes_out = self.__bytes_in = 0
+        self.__notifications = {}
+        self.__latency = {}
+
+    def sent(self, size: int):
+        self.__packets_out += 1
+        self.__bytes_out += size
+
+    def received(self, size: int):
+        self.__bytes_in += size
+
+    def notified(self, key: Hashable):
+        notifications = self.__notifications
+        notifications[key] = notifications.get(key, 0) + 1
+
+    def answered(self, did: int, cid: int, latency: float):
+        histogram = self.__latency.get((did, cid))
+        if histogram is None:
+            histogram = self.__latency[(did, cid)] = Histogram(self.buckets)
+        histogram.observe(latency)
+
+    @property
+    def stats(self) -> TelemetryStats:
+        return TelemetryStats(time.monotonic() - self.__started, self.__packets_out, self.__bytes_out,
+                              self.__bytes_in, {_label(k): v for k, v in list(self.__notifications.items())},
+                              {_label(k): h.stats for k, h in list(self.__latency.items())})
+
+
+def _label(key) -> str:
+    return '.'.join(map(str, key))
+
+
+def _plain(value):
+    if hasattr(value, '_asdict'):
+        return {k: _plain(v) for k, v in value._asdict().items()}
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (tuple, list)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def to_json(stats: Dict[str, NamedTuple], **kwargs) -> str:
+    """Serialises the ``stats()`` of a toy to JSON"""
+    return json.dumps(_plain(stats), **kwargs)
+
+
+def to_prometheus(stats: Dict[str, NamedTuple], prefix: str = 'spherov2', labels: Dict[str, str] = None) -> str:
+    """Formats the ``stats()`` of a toy in the Prometheus text exposition format. Every metric is named
+    ``<prefix>_<section>_<field>`` and carries ``labels``, such as the address of the toy; per-key fields get an extra
+    ``key`` label."""
+    lines = []
+    base = dict(labels or {})
+
+    def sample(name, value, extra=None):
+        tags = {**base, **(extra or {})}
+        tag = ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in tags.items())
+        lines.append('%s{%s} %s' % (name, tag, float(value)) if tag else '%s %s' % (name, float(value)))
+
+    def histogram(name, h: HistogramStats, extra):
+        cumulative = 0
+        for bound, count in zip(h.bounds + (float('inf'),), h.counts):
+            cumulative += count
+            sample(name + '_bucket', cumulative, {**extra, 'le': '+Inf' if bound == float('inf') else bound})
+        sample(name + '_sum', h.sum, extra)
+        sample(name + '_count', h.count, extra)
+
+    for section, values in stats.items():
+        for field, value in values._asdict().items():
+            name = '%s_%s_%s' % (prefix, section, field)
+            if isinstance(value, dict):
+                histograms = value and isinstance(next(iter(value.values())), HistogramStats)
+                lines.append('# TYPE %s %s' % (name, 'histogram' if histograms else 'gauge'))
+                for key, v in value.items():
+                    if isinstance(v, HistogramStats):
+                        histogram(name, v, {'key': key})
+                    else:
+                        sample(name, v, {'key': key})
+            elif isinstance(value, (int, float)):
+                lines.append('# TYPE %s gauge' % name)
+                sample(name, value)
+    return '\n'.join(lines) + '\n'
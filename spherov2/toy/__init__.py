@@ -1,16 +1,29 @@
+import queue
 import threading
 import time
+import traceback
 from collections import OrderedDict, defaultdict
 from concurrent import futures
+from contextlib import contextmanager
 from functools import partial
-from queue import SimpleQueue
-from typing import NamedTuple, Callable
+from typing import NamedTuple, Callable, Dict
 
+from spherov2.commanding import Captured, Awaited, Replay, unbind, CommandOptions
+from spherov2.controls import ResponseModes
 from spherov2.controls.v1 import Packet as PacketV1
 from spherov2.controls.v2 import Packet as PacketV2
+from spherov2.dispatch import shared_dispatcher
+from spherov2.helper import max_write_size
+from spherov2.pending import PendingRequests
+from spherov2.scheduler import WriteQueue, Priorities
+from spherov2.telemetry import Telemetry
 from spherov2.types import ToyType
 
 
+_sweep_interval = .5
+"""Seconds between two sweeps of the requests past their deadline by the writer thread"""
+
+
 class ToySensor(NamedTuple):
     bit: int
     min_value: float
@@ -18,7 +31,7 @@ class ToySensor(NamedTuple):
     modifier: Callable[[float], float] = None
 
 
-class Toy:
+class Toy(CommandOptions):
     toy_type = ToyType('Robot', None, 'Sphero', .06)
     sensors = OrderedDict()
     extended_sensors = OrderedDict()
@@ -29,20 +42,47 @@ class Toy:
                   ('22bb746f-2bb2-7554-2d6f-726568705327', bytearray([7]))]
     _packet = PacketV1
     _require_target = False
+    # (did, cid) of commands that only set a state, and the slice of their data that, along with the target, tells
+    # which state they set. An unsent command is replaced by a newer one setting the same state.
+    _coalescing = {(0x02, 0x20): slice(0), (0x02, 0x21): slice(0), (0x02, 0x30): slice(3, 4),
+                   (0x02, 0x33): slice(0)}
+    # Priority of the commands of a device, or of single commands, and tests telling which motion commands stop
+    # the toy. Other commands are sent as Priorities.CONFIG.
+    _priorities = {(0x02, 0x20): Priorities.COSMETIC, (0x02, 0x21): Priorities.COSMETIC,
+                   (0x02, 0x30): Priorities.MOTION, (0x02, 0x31): Priorities.MOTION, (0x02, 0x33): Priorities.MOTION}
+    _stops = {(0x02, 0x30): lambda data: data[0] == 0 or data[3] == 0,
+              (0x02, 0x33): lambda data: data[0] in (0, 3) and data[2] in (0, 3)}
+    # Capability table of the toy class, filled on first use: whether it implements each command, and the command
+    # each ToyUtil operation resolves to
+    _capabilities = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._capabilities = {}
 
     def __init__(self, toy, adapter_cls):
         self.address = toy.address
         self.name = toy.name
 
+        super().__init__(type(self), self.__new_packet)
         self.__adapter = None
         self.__adapter_cls = adapter_cls
         self._packet_manager = self._packet.Manager()
-        self.__decoder = self._packet.Collector(self.__new_packet)
-        self.__waiting = defaultdict(SimpleQueue)
+        self.__pending = PendingRequests()
+        self.__waiting = defaultdict(list)
+        self.__deadlines = {}
         self.__listeners = defaultdict(dict)
+        self.__local = threading.local()
 
         self.__thread = None
-        self.__packet_queue = SimpleQueue()
+        self.__packet_queue = WriteQueue(self.__coalesce)
+        self.__write_size = 20
+
+        self.__window_size = 0
+
+        self.dispatcher = shared_dispatcher().view()
+        self.telemetry = Telemetry()
+        self.tap = None
 
     def __enter__(self):
         if self.__adapter is not None:
@@ -50,6 +90,7 @@ class Toy:
         self.__adapter = self.__adapter_cls(self.address)
         self.__thread = threading.Thread(target=self.__process_packet)
         try:
+            self.__write_size = max_write_size(self.__adapter)
             for uuid, data in self._handshake:
                 self.__adapter.write(uuid, data)
             self.__adapter.set_callback(self._response_uuid, self.__api_read)
@@ -60,34 +101,204 @@ class Toy:
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.__adapter.close()
-        self.__adapter = None
         if self.__thread.is_alive():
-            self.__packet_queue.put(None)
+            self.__packet_queue.put(None, priority=Priorities.COSMETIC)
             self.__thread.join()
-        self.__packet_queue = SimpleQueue()
+        try:
+            self.__adapter.close()
+        except Exception:
+            if exc_type is None:
+                raise
+            # The error raised by the block propagates, the one raised while closing is only printed
+            traceback.print_exc()
+        finally:
+            self.__adapter = None
+            self.__packet_queue = WriteQueue(self.__coalesce)
 
     def __process_packet(self):
+        swept = time.monotonic()
         while self.__adapter is not None:
-            payload = self.__packet_queue.get()
-            if payload is None:
+            self.pacer.wait()
+            try:
+                item = self.__packet_queue.get(_sweep_interval)
+            except queue.Empty:
+                item = ()
+            now = time.monotonic()
+            if now - swept >= _sweep_interval:
+                self.__pending.sweep()
+                self.__sweep_notifications(now)
+                swept = now
+            if item is None:
                 break
-            # print('request ' + ' '.join([hex(c) for c in payload]))
-            while payload:
-                self.__adapter.write(self._send_uuid, payload[:20])
-                payload = payload[20:]
-            time.sleep(self.toy_type.cmd_safe_interval)
+            if not item:
+                continue
+            key, payload = item
+            tap = self.tap
+            if tap is not None:
+                tap.tx(self._send_uuid, payload)
+            size = self.__write_size
+            write_many = getattr(self.__adapter, 'write_many', None)
+            try:
+                if write_many is not None:
+                    write_many(self._send_uuid, [payload[i:i + size] for i in range(0, len(payload), size)])
+                else:
+                    for i in range(0, len(payload), size):
+                        self.__adapter.write(self._send_uuid, payload[i:i + size])
+            except Exception as e:
+                traceback.print_exc()
+                self.__pending.fail(key, e)
+                continue
+            self.pacer.sent(key)
+            self.telemetry.sent(len(payload))
+
+    def pipeline(self, window: int = 4):
+        """Allows up to ``window`` commands to wait for their responses at the same time, instead of the default
+        stop-and-wait behaviour. Responses are matched to their commands by sequence number, so they may arrive in
+        any order. Set ``window`` to ``0`` to turn pipelining off.
+
+        With pipelining on, commands can also be issued without blocking by :meth:`submit`."""
+        if window < 0:
+            raise ValueError('Window size must not be negative')
+        self.__window_size = window
+        self.__pending.limit = window
+
+    def submit(self, command: Callable, *args, **kwargs) -> futures.Future:
+        """Issues ``command``, a method of this toy such as ``toy.drive_with_heading``, without waiting for its
+        response. Returns a future resolving to whatever the command returns. No thread is kept for the command:
+        it only waits while ``window`` commands are already waiting for their responses, and it is run again to
+        decode its response, and each notification it waits for, on the thread receiving them."""
+        if not self.__window_size:
+            raise RuntimeError('Enable pipelining with pipeline() before submitting commands')
+        result = futures.Future()
+        self.__local.submitting = True
+        try:
+            value = command(*args, **kwargs)
+        except Captured as captured:
+            captured.future.add_done_callback(partial(self.__responded, command, args, kwargs, captured.packet, result))
+        else:
+            result.set_result(value)
+        finally:
+            self.__local.submitting = False
+        return result
+
+    def __responded(self, command, args, kwargs, packet, result, future):
+        try:
+            response = future.result()
+        except BaseException as e:
+            if isinstance(e, futures.TimeoutError):
+                self.pacer.timeout(packet.id)
+            result.set_exception(e)
+            return
+        self.__answered(packet, response)
+        replay = Replay(self, packet, response)
+        self.__resume(replay, partial(replay.run, unbind(command), *args, **kwargs), result)
+
+    def __resume(self, replay, run, result):
+        """Runs a submitted command again, until it waits for a notification not received yet. That notification
+        resumes it, so that the thread delivering it is never blocked."""
+        try:
+            value = run()
+        except Awaited as awaited:
+            future = futures.Future()
+            self.__deadlines[future] = time.monotonic() + awaited.timeout, awaited.key
+            self.__waiting[awaited.key].append(future)
+            future.add_done_callback(partial(self.__notified, replay, run, result))
+        except BaseException as e:
+            result.set_exception(e)
+        else:
+            result.set_result(value)
+
+    def __notified(self, replay, run, result, future):
+        self.__deadlines.pop(future, None)
+        try:
+            replay.notifications.append(future.result())
+        except BaseException as e:
+            result.set_exception(e)
+            return
+        self.__resume(replay, run, result)
 
-    def _execute(self, packet):
+    def __sweep_notifications(self, now):
+        """Fails the notifications awaited by submitted commands past their deadline"""
+        for future, (deadline, key) in list(self.__deadlines.items()):
+            if deadline < now and self.__deadlines.pop(future, None) is not None:
+                waiting = self.__waiting.get(key)
+                if waiting and future in waiting:
+                    waiting.remove(future)
+                if not future.done():
+                    future.set_exception(futures.TimeoutError())
+
+    @contextmanager
+    def response_mode(self, response_mode: ResponseModes):
+        """Sends every command issued by the current thread within the block with ``response_mode``, overriding
+        :meth:`set_response_mode`"""
+        previous = getattr(self.__local, 'response_mode', None)
+        self.__local.response_mode = response_mode
+        try:
+            yield
+        finally:
+            self.__local.response_mode = previous
+
+    def _response_mode(self, did, cid) -> ResponseModes:
+        response_mode = getattr(self.__local, 'response_mode', None)
+        if response_mode is not None:
+            return response_mode
+        return super()._response_mode(did, cid)
+
+    def _execute(self, packet, timeout=10.0):
         if self.__adapter is None:
             raise RuntimeError('Use toys in context manager')
-        self.__packet_queue.put(packet.build())
-        return self._wait_packet(packet.id)
+        coalescing_key, priority = self.__coalescing_key(packet), self.__priority(packet)
+        if packet.response_mode != ResponseModes.ALWAYS:
+            self.__packet_queue.put((packet.id, packet.build()), coalescing_key, priority)
+            return None
+        future = self.__pending.add(packet.id, timeout)
+        self.__packet_queue.put((packet.id, packet.build()), coalescing_key, priority)
+        if self.__window_size and getattr(self.__local, 'submitting', False):
+            raise Captured(packet, timeout, future)
+        try:
+            response = future.result(timeout)
+        except futures.TimeoutError:
+            self.__pending.expire(packet.id)
+            self.pacer.timeout(packet.id)
+            raise
+        self.__answered(packet, response)
+        return response
+
+    def __answered(self, packet, response):
+        if response is not None:
+            latency = self.pacer.received(packet.id, response.is_busy)
+            if latency is not None:
+                self.telemetry.answered(packet.did, packet.cid, latency)
+
+    def __coalescing_key(self, packet):
+        data_slice = self._coalescing.get((packet.did, packet.cid))
+        if data_slice is None:
+            return None
+        return packet.did, packet.cid, getattr(packet, 'tid', None), bytes(packet.data[data_slice])
+
+    def __priority(self, packet) -> Priorities:
+        key = packet.did, packet.cid
+        stop = self._stops.get(key)
+        if stop is not None and stop(packet.data):
+            return Priorities.SAFETY
+        priority = self._priorities.get(key)
+        if priority is None:
+            priority = self._priorities.get((packet.did, None), Priorities.CONFIG)
+        return priority
+
+    def __coalesce(self, replaced, item):
+        self.__pending.transfer(replaced[0], None if item is None else item[0])
 
     def _wait_packet(self, key, timeout=10.0, check_error=False):
         future = futures.Future()
-        self.__waiting[key].put(future)
-        packet = future.result(timeout)
+        waiting = self.__waiting[key]
+        waiting.append(future)
+        try:
+            packet = future.result(timeout)
+        except futures.TimeoutError:
+            if future in waiting:
+                waiting.remove(future)
+            raise
         if check_error:
             packet.check_error()
         return packet
@@ -99,19 +310,43 @@ class Toy:
         self.__listeners[key[0]].pop(listener)
 
     def __api_read(self, char, data):
-        self.__decoder.add(data)
+        tap = self.tap
+        if tap is not None:
+            tap.rx(self._response_uuid, data)
+        self.telemetry.received(len(data))
+        self._decoder.add(data)
 
     def __new_packet(self, packet):
-        # print('response ' + ' '.join([hex(c) for c in packet.build()]))
         key = packet.id
-        queue = self.__waiting[key]
-        while not queue.empty():
-            queue.get().set_result(packet)
+        if not self.__pending.resolve(packet):
+            waiting = self.__waiting.pop(key, None)
+            if waiting:
+                for future in waiting:
+                    if not future.done():
+                        future.set_result(packet)
+            elif not self._report_error(packet, self.dispatcher.dispatch) and not packet.is_response:
+                self.telemetry.notified(key)
         for f in self.__listeners[key].values():
-            threading.Thread(target=f, args=(packet,)).start()
+            self.dispatcher.dispatch(f, packet)
+
+    def stats(self) -> Dict[str, NamedTuple]:
+        """Counters describing the connection with the toy. ``dispatch`` counts the listener events of this toy only,
+        those of every toy are in ``shared_dispatcher().stats``."""
+        return {**super().stats(), 'queue': self.__packet_queue.stats, 'dispatch': self.dispatcher.stats,
+                'pending': self.__pending.stats, 'telemetry': self.telemetry.stats}
+
+    @classmethod
+    def implements(cls, method, with_target=False) -> bool:
+        """Whether the toy has the command ``method``, taking a target processor if ``with_target`` is set. Answers
+        are kept in the capability table of the toy class."""
+        try:
+            return cls._capabilities[method, with_target]
+        except KeyError:
+            implemented = cls._capabilities[method, with_target] = cls.__implements(method, with_target)
+            return implemented
 
     @classmethod
-    def implements(cls, method, with_target=False):
+    def __implements(cls, method, with_target):
         m = getattr(cls, method.__name__, None)
         if m is method:
             return with_target == cls._require_target
@@ -124,5 +359,11 @@ class Toy:
 
 class ToyV2(Toy):
     _packet = PacketV2
+    _coalescing = {(0x16, 0x01): slice(0), (0x16, 0x07): slice(0), (0x1a, 0x0e): slice(2), (0x1a, 0x1a): slice(4),
+                   (0x1a, 0x2f): slice(0)}
+    _priorities = {(0x16, 0x01): Priorities.MOTION, (0x16, 0x07): Priorities.MOTION, (0x16, 0x0b): Priorities.MOTION,
+                   (0x17, None): Priorities.MOTION, (0x1a, None): Priorities.COSMETIC}
+    _stops = {(0x16, 0x01): lambda data: data[0] == 0 and data[2] == 0,
+              (0x16, 0x07): lambda data: data[0] == 0}
     _handshake = []
     _response_uuid = _send_uuid = '00010002-574f-4f20-5370-6865726f2121'
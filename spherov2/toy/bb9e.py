@@ -1,6 +1,6 @@
 from collections import OrderedDict
 from enum import IntEnum
-from functools import partialmethod, lru_cache
+from functools import partialmethod
 
 from spherov2.commands.animatronic import Animatronic
 from spherov2.commands.api_and_shell import ApiAndShell
@@ -13,6 +13,7 @@ from spherov2.commands.power import Power
 from spherov2.commands.sensor import Sensor
 from spherov2.commands.system_info import SystemInfo
 from spherov2.controls.v2 import DriveControl, LedControl, SensorControl
+from spherov2.helper import lazy_property
 from spherov2.toy import ToyV2, ToySensor, Toy
 from spherov2.types import ToyType
 
@@ -200,17 +201,14 @@ class BB9E(ToyV2):
     exit_factory_mode = FactoryTest.exit_factory_mode
     get_chassis_id = FactoryTest.get_chassis_id
 
-    @property
-    @lru_cache(None)
+    @lazy_property
     def drive_control(self):
         return DriveControl(self)
 
-    @property
-    @lru_cache(None)
+    @lazy_property
     def multi_led_control(self):
         return LedControl(self)
 
-    @property
-    @lru_cache(None)
+    @lazy_property
     def sensor_control(self):
         return SensorControl(self)
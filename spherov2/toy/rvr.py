@@ -1,5 +1,5 @@
 from enum import IntEnum
-from functools import lru_cache, partialmethod
+from functools import partialmethod
 
 from spherov2.commands.api_and_shell import ApiAndShell
 from spherov2.commands.connection import Connection
@@ -12,6 +12,7 @@ from spherov2.commands.sensor import Sensor
 from spherov2.commands.system_info import SystemInfo
 from spherov2.commands.system_mode import SystemMode
 from spherov2.controls.v2 import DriveControl, LedControl, StreamingControl, Processors
+from spherov2.helper import lazy_property
 from spherov2.toy import Toy, ToyV2
 from spherov2.types import ToyType
 
@@ -258,17 +259,14 @@ class RVR(ToyV2):
     enable_extended_life_test = partialmethod(FactoryTest.enable_extended_life_test, proc=Processors.PRIMARY)
     get_factory_mode_status = FactoryTest.get_factory_mode_status
 
-    @property
-    @lru_cache(None)
+    @lazy_property
     def drive_control(self):
         return DriveControl(self)
 
-    @property
-    @lru_cache(None)
+    @lazy_property
     def multi_led_control(self):
         return LedControl(self)
 
-    @property
-    @lru_cache(None)
+    @lazy_property
     def sensor_control(self):
         return StreamingControl(self)
@@ -1,11 +1,12 @@
 from collections import OrderedDict
-from functools import partialmethod, lru_cache
+from functools import partialmethod
 
 from spherov2.commands.async_ import Async
 from spherov2.commands.bootloader import Bootloader
 from spherov2.commands.core import Core
 from spherov2.commands.sphero import Sphero as SpheroCmd
 from spherov2.controls.v1 import DriveControl, SensorControl
+from spherov2.helper import lazy_property
 from spherov2.toy import ToySensor, Toy
 from spherov2.types import ToyType
 
@@ -107,12 +108,10 @@ class Sphero(Toy):
     add_did_sleep_notify_listener = partialmethod(Toy._add_listener, Async.did_sleep_notify)
     remove_did_sleep_notify_listener = partialmethod(Toy._remove_listener, Async.did_sleep_notify)
 
-    @property
-    @lru_cache(None)
+    @lazy_property
     def drive_control(self):
         return DriveControl(self)
 
-    @property
-    @lru_cache(None)
+    @lazy_property
     def sensor_control(self):
         return SensorControl(self)
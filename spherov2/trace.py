@@ -0,0 +1,183 @@
+import os
+import struct
+import threading
+import time
+from enum import IntEnum
+from typing import NamedTuple, Iterator
+
+from spherov2.helper import to_bytes, to_int
+
+MAGIC = b'SPTR'
+VERSION = 1
+
+_record = struct.Struct('>HdBB')
+"""[LENGTH, TIMESTAMP, DIRECTION, UUID INDEX], followed by LENGTH bytes of data"""
+
+
+class Directions(IntEnum):
+    TX = 0
+    RX = 1
+    UUID = 2
+
+
+class TraceHeader(NamedTuple):
+    toy_type: str
+    address: str
+    started: float
+
+
+class TraceRecord(NamedTuple):
+    timestamp: float
+    direction: Directions
+    uuid: str
+    data: bytes
+
+
+class TraceWriter:
+    """Packet tap writing timestamped frames to an append-only binary trace.
+
+    A trace starts with ``MAGIC``, a version byte, the toy type and address as length-prefixed strings, and the start
+    time. Each record is a :data:`_record` header followed by its data. A characteristic is written as a
+    :attr:`Directions.UUID` record the first time it appears, and frames refer to it by index. When ``max_bytes`` is
+    given, the trace is rotated to ``path.1``, ``path.2``... up to ``backups`` files once it grows past that size.
+
+    Attach it to a toy with ``toy.tap = writer``, or to an adapter with :func:`get_tapped_adapter` to also capture the
+    handshake."""
+
+    def __init__(self, path: str, toy_type: str = '', address: str = '', max_bytes: int = None, backups: int = 1):
+        self.path = path
+        self.toy_type = toy_type
+        self.address = address
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.__lock = threading.Lock()
+        self.__file = None
+        self.__uuids = {}
+        self.__open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __open(self):
+        self.__file = open(self.path, 'wb')
+        self.__uuids = {}
+        header = bytearray(MAGIC)
+        header.append(VERSION)
+        for s in (self.toy_type, self.address):
+            s = s.encode('utf_8')
+            header.extend(to_bytes(len(s), 2))
+            header.extend(s)
+        header.extend(struct.pack('>d', time.time()))
+        self.__file.write(header)
+
+    def __rotate(self):
+        self.__file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{i}'):
+                os.replace(f'{self.path}.{i}', f'{self.path}.{i + 1}')
+        if self.backups > 0:
+            os.replace(self.path, f'{self.path}.1')
+        self.__open()
+
+    def record(self, direction: Directions, uuid: str, data):
+        timestamp = time.time()
+        with self.__lock:
+            if self.__file is None:
+                return
+            index = self.__uuids.get(uuid)
+            if index is None:
+                index = self.__uuids[uuid] = len(self.__uuids)
+                name = uuid.encode('ascii')
+                self.__file.write(_record.pack(len(name), timestamp, Directions.UUID, index) + name)
+            self.__file.write(_record.pack(len(data), timestamp, direction, index))
+            self.__file.write(data)
+            if self.max_bytes is not None and self.__file.tell() >= self.max_bytes:
+                self.__rotate()
+
+    def tx(self, uuid: str, data):
+        self.record(Directions.TX, uuid, data)
+
+    def rx(self, uuid: str, data):
+        self.record(Directions.RX, uuid, data)
+
+    def close(self):
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.close()
+                self.__file = None
+
+
+class TraceReader:
+    """Reads a trace written by :class:`TraceWriter`. Iterating over it yields :class:`TraceRecord` items."""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self.__data = f.read()
+        data = self.__data
+        if data[:4] != MAGIC:
+            raise ValueError('Not a packet trace')
+        if data[4] != VERSION:
+            raise ValueError(f'Unsupported trace version {data[4]}')
+        pos, strings = 5, []
+        for _ in range(2):
+            size = to_int(data[pos:pos + 2])
+            strings.append(data[pos + 2:pos + 2 + size].decode('utf_8'))
+            pos += 2 + size
+        self.header = TraceHeader(*strings, struct.unpack_from('>d', data, pos)[0])
+        self.__start = pos + 8
+
+    def __iter__(self) -> Iterator[TraceRecord]:
+        data, pos, end = self.__data, self.__start, len(self.__data)
+        uuids = {}
+        unpack, size = _record.unpack_from, _record.size
+        while pos + size <= end:
+            length, timestamp, direction, index = unpack(data, pos)
+            pos += size
+            payload = data[pos:pos + length]
+            pos += length
+            if len(payload) < length:
+                break
+            if direction == Directions.UUID:
+                uuids[index] = payload.decode('ascii')
+            else:
+                yield TraceRecord(timestamp, Directions(direction), uuids.get(index), payload)
+
+
+def get_tapped_adapter(adapter_cls, tap):
+    """Gets an anonymous adapter class recording every write to and notification from ``adapter_cls`` with ``tap``,
+    such as a :class:`TraceWriter`."""
+
+    class TappedAdapter(adapter_cls):
+        __writing = threading.local()
+
+        def set_callback(self, uuid, cb):
+            def tapped(char, data):
+                tap.rx(uuid, data)
+                cb(char, data)
+
+            super().set_callback(uuid, tapped)
+
+        def __write(self, uuid, fragments, write, *args):
+            # Adapters may implement write and write_many with each other, only the outermost call is tapped
+            writing = self.__writing
+            if getattr(writing, 'active', False):
+                return write(uuid, *args)
+            for fragment in fragments:
+                tap.tx(uuid, fragment)
+            writing.active = True
+            try:
+                write(uuid, *args)
+            finally:
+                writing.active = False
+
+        def write(self, uuid, data):
+            self.__write(uuid, (data,), super().write, data)
+
+        if hasattr(adapter_cls, 'write_many'):
+            def write_many(self, uuid, fragments):
+                self.__write(uuid, fragments, super().write_many, fragments)
+
+    return TappedAdapter
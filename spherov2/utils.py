@@ -10,34 +10,144 @@ from spherov2.commands.sensor import CollisionDetectionMethods, Sensor, Sensitiv
     SensitivityLevels
 from spherov2.commands.sphero import CollisionDetectionMethods as SpheroCollisionDetectionMethods, Sphero
 from spherov2.controls import RawMotorModes
-from spherov2.controls.v2 import Processors
+from spherov2.controls.v2 import Processors, LedControl
 from spherov2.toy import Toy
 from spherov2.toy.bb9e import BB9E
 from spherov2.toy.bolt import BOLT
-from spherov2.toy.mini import Mini
 from spherov2.toy.r2d2 import R2D2
-from spherov2.toy.r2q5 import R2Q5
 from spherov2.toy.rvr import RVR
 
 
+def _resolve(toy: Toy, operation: str, candidates):
+    """Gets the action of the first of ``candidates``, ``(command, with_target, action)`` items, whose command the toy
+    implements, or ``None``. The choice is made once per toy class and kept in its capability table."""
+    capabilities = toy._capabilities
+    try:
+        return capabilities[operation]
+    except KeyError:
+        action = capabilities[operation] = next(
+            (action for command, with_target, action in candidates if toy.implements(command, with_target)), None)
+        return action
+
+
+_sleep = ((Core.sleep, False, lambda toy: toy.sleep(IntervalOptions.NONE, 0, 0)),
+          (Power.sleep, False, lambda toy: toy.sleep()))
+_ping = ((Core.ping, False, lambda toy: toy.ping()),
+         (ApiAndShell.ping, False, lambda toy: toy.ping(None)),
+         (ApiAndShell.ping, True, lambda toy: toy.ping(None, Processors.PRIMARY)))
+_reset_locator = ((Sphero.configure_locator, False, lambda toy: toy.configure_locator(0, 0, 0, 0)),
+                  (Sensor.reset_locator_x_and_y, False, lambda toy: toy.reset_locator_x_and_y()))
+_configure_collision_detection = (
+    (Sensor.configure_collision_detection, False, lambda toy: toy.configure_collision_detection(
+        CollisionDetectionMethods.ACCELEROMETER_BASED_DETECTION, 90, 130, 90, 130, 1)),
+    (Sphero.configure_collision_detection, False, lambda toy: toy.configure_collision_detection(
+        SpheroCollisionDetectionMethods.DEFAULT, 90, 130, 90, 130, 1)),
+    (Sensor.configure_sensitivity_based_collision_detection, False,
+     lambda toy: toy.configure_sensitivity_based_collision_detection(
+         SensitivityBasedCollisionDetectionMethods.ACCELEROMETER_BASED_DETECTION, SensitivityLevels.VERY_HIGH, 1)))
+_set_power_notifications = (
+    (Power.enable_charger_state_changed_notify, False,
+     lambda toy, enable: toy.enable_charger_state_changed_notify(enable)),
+    (Power.enable_battery_state_changed_notify, False,
+     lambda toy, enable: toy.enable_battery_state_changed_notify(enable)),
+    (Power.enable_battery_voltage_state_change_notify, False,
+     lambda toy, enable: toy.enable_battery_voltage_state_change_notify(enable)))
+
+
+def _rgb(*lights):
+    """Layout of RGB lights given as ``(red, green, blue)`` LEDs, taking the values ``(r, g, b)``"""
+    return {led: i for light in lights for i, led in enumerate(light)}
+
+
+def _blue(*lights):
+    """Layout of RGB lights given as ``(red, green, blue)`` LEDs lit in blue only, taking the values
+    ``(0, brightness)``"""
+    return {led: int(i == 2) for light in lights for i, led in enumerate(light)}
+
+
+def _rvr_light(name):
+    return tuple(RVR.LEDs[f'{name}_{channel}'] for channel in ('RED', 'GREEN', 'BLUE'))
+
+
+# Logical LED groups of each toy class and their layouts. Groups are looked up along the MRO of a toy class, so that
+# the groups of a subclass override those of its bases.
+_led_groups = {
+    BB9E: {
+        'main': _rgb((BB9E.LEDs.BODY_RED, BB9E.LEDs.BODY_GREEN, BB9E.LEDs.BODY_BLUE)),
+        'back_brightness': {BB9E.LEDs.AIMING: 1},
+        'head': {BB9E.LEDs.HEAD: 0},
+    },
+    R2D2: {
+        'main': _rgb((R2D2.LEDs.BACK_RED, R2D2.LEDs.BACK_GREEN, R2D2.LEDs.BACK_BLUE),
+                     (R2D2.LEDs.FRONT_RED, R2D2.LEDs.FRONT_GREEN, R2D2.LEDs.FRONT_BLUE)),
+        'front': _rgb((R2D2.LEDs.FRONT_RED, R2D2.LEDs.FRONT_GREEN, R2D2.LEDs.FRONT_BLUE)),
+        'back': _rgb((R2D2.LEDs.BACK_RED, R2D2.LEDs.BACK_GREEN, R2D2.LEDs.BACK_BLUE)),
+        'back_brightness': _blue((R2D2.LEDs.BACK_RED, R2D2.LEDs.BACK_GREEN, R2D2.LEDs.BACK_BLUE)),
+        'holo_projector': {R2D2.LEDs.HOLO_PROJECTOR: 0},
+        'logic_display': {R2D2.LEDs.LOGIC_DISPLAYS: 0},
+    },
+    BOLT: {
+        'front': _rgb((BOLT.LEDs.FRONT_RED, BOLT.LEDs.FRONT_GREEN, BOLT.LEDs.FRONT_BLUE)),
+        'back': _rgb((BOLT.LEDs.BACK_RED, BOLT.LEDs.BACK_GREEN, BOLT.LEDs.BACK_BLUE)),
+        'back_brightness': _blue((BOLT.LEDs.BACK_RED, BOLT.LEDs.BACK_GREEN, BOLT.LEDs.BACK_BLUE)),
+    },
+    RVR: {
+        'main': _rgb(*map(_rvr_light, ('RIGHT_HEADLIGHT', 'LEFT_HEADLIGHT', 'LEFT_STATUS_INDICATION',
+                                       'RIGHT_STATUS_INDICATION', 'BATTERY_DOOR_FRONT', 'BATTERY_DOOR_REAR',
+                                       'POWER_BUTTON_FRONT', 'POWER_BUTTON_REAR', 'LEFT_BRAKELIGHT',
+                                       'RIGHT_BRAKELIGHT'))),
+        'front': _rgb(_rvr_light('RIGHT_HEADLIGHT'), _rvr_light('LEFT_HEADLIGHT')),
+        'back': _rgb(_rvr_light('RIGHT_BRAKELIGHT'), _rvr_light('LEFT_BRAKELIGHT')),
+        'back_brightness': _blue(_rvr_light('RIGHT_BRAKELIGHT'), _rvr_light('LEFT_BRAKELIGHT')),
+        'left_front': _rgb(_rvr_light('LEFT_HEADLIGHT')),
+        'right_front': _rgb(_rvr_light('RIGHT_HEADLIGHT')),
+        'battery_side': _rgb(_rvr_light('BATTERY_DOOR_FRONT')),
+        'power_side': _rgb(_rvr_light('POWER_BUTTON_FRONT')),
+    },
+}
+
+
+def _led_plan(toy: Toy, group: str):
+    """Gets the compiled plan of the LED ``group`` of the toy, or ``None`` if the toy has no such group or cannot
+    set multiple LEDs. Plans are compiled once per toy class and kept in its capability table."""
+    capabilities = toy._capabilities
+    try:
+        return capabilities['leds', group]
+    except KeyError:
+        plan = None
+        if hasattr(type(toy), 'multi_led_control'):
+            for cls in type(toy).__mro__:
+                layout = _led_groups.get(cls, {}).get(group)
+                if layout is not None:
+                    leds = frozenset(toy.LEDs)
+                    plan = LedControl.compile({led: i for led, i in layout.items() if led in leds})
+                    break
+        capabilities['leds', group] = plan
+        return plan
+
+
+def _set_led_group(toy: Toy, group: str, values, not_supported_handler: Callable[[], None] = None):
+    plan = _led_plan(toy, group)
+    if plan is not None:
+        toy.multi_led_control.apply(plan, values)
+    elif not_supported_handler:
+        not_supported_handler()
+
+
 class ToyUtil:
     @staticmethod
     def sleep(toy: Toy, not_supported_handler: Callable[[], None] = None):
-        if toy.implements(Core.sleep):
-            toy.sleep(IntervalOptions.NONE, 0, 0)
-        elif toy.implements(Power.sleep):
-            toy.sleep()
+        action = _resolve(toy, 'sleep', _sleep)
+        if action is not None:
+            action(toy)
         elif not_supported_handler:
             not_supported_handler()
 
     @staticmethod
     def ping(toy: Toy, not_supported_handler: Callable[[], None] = None):
-        if toy.implements(Core.ping):
-            toy.ping()
-        elif toy.implements(ApiAndShell.ping):
-            toy.ping(None)
-        elif toy.implements(ApiAndShell.ping, True):
-            toy.ping(None, Processors.PRIMARY)
+        action = _resolve(toy, 'ping', _ping)
+        if action is not None:
+            action(toy)
         elif not_supported_handler:
             not_supported_handler()
 
@@ -104,208 +214,59 @@ class ToyUtil:
     @staticmethod
     def set_main_led(toy: Toy, r: int, g: int, b: int, is_user_color: bool,
                      not_supported_handler: Callable[[], None] = None):
-        def _fallback():
-            if isinstance(toy, (R2D2, R2Q5)):
-                mapping = {
-                    toy.LEDs.BACK_RED: r,
-                    toy.LEDs.BACK_GREEN: g,
-                    toy.LEDs.BACK_BLUE: b,
-                    toy.LEDs.FRONT_RED: r,
-                    toy.LEDs.FRONT_GREEN: g,
-                    toy.LEDs.FRONT_BLUE: b
-                }
-            elif isinstance(toy, BB9E):
-                mapping = {
-                    toy.LEDs.BODY_RED: r,
-                    toy.LEDs.BODY_GREEN: g,
-                    toy.LEDs.BODY_BLUE: b
-                }
-            elif isinstance(toy, RVR):
-                mapping = {
-                    toy.LEDs.RIGHT_HEADLIGHT_RED: r,
-                    toy.LEDs.RIGHT_HEADLIGHT_GREEN: g,
-                    toy.LEDs.RIGHT_HEADLIGHT_BLUE: b,
-                    toy.LEDs.LEFT_HEADLIGHT_RED: r,
-                    toy.LEDs.LEFT_HEADLIGHT_GREEN: g,
-                    toy.LEDs.LEFT_HEADLIGHT_BLUE: b,
-                    toy.LEDs.LEFT_STATUS_INDICATION_RED: r,
-                    toy.LEDs.LEFT_STATUS_INDICATION_GREEN: g,
-                    toy.LEDs.LEFT_STATUS_INDICATION_BLUE: b,
-                    toy.LEDs.RIGHT_STATUS_INDICATION_RED: r,
-                    toy.LEDs.RIGHT_STATUS_INDICATION_GREEN: g,
-                    toy.LEDs.RIGHT_STATUS_INDICATION_BLUE: b,
-                    toy.LEDs.BATTERY_DOOR_FRONT_RED: r,
-                    toy.LEDs.BATTERY_DOOR_FRONT_GREEN: g,
-                    toy.LEDs.BATTERY_DOOR_FRONT_BLUE: b,
-                    toy.LEDs.BATTERY_DOOR_REAR_RED: r,
-                    toy.LEDs.BATTERY_DOOR_REAR_GREEN: g,
-                    toy.LEDs.BATTERY_DOOR_REAR_BLUE: b,
-                    toy.LEDs.POWER_BUTTON_FRONT_RED: r,
-                    toy.LEDs.POWER_BUTTON_FRONT_GREEN: g,
-                    toy.LEDs.POWER_BUTTON_FRONT_BLUE: b,
-                    toy.LEDs.POWER_BUTTON_REAR_RED: r,
-                    toy.LEDs.POWER_BUTTON_REAR_GREEN: g,
-                    toy.LEDs.POWER_BUTTON_REAR_BLUE: b,
-                    toy.LEDs.LEFT_BRAKELIGHT_RED: r,
-                    toy.LEDs.LEFT_BRAKELIGHT_GREEN: g,
-                    toy.LEDs.LEFT_BRAKELIGHT_BLUE: b,
-                    toy.LEDs.RIGHT_BRAKELIGHT_RED: r,
-                    toy.LEDs.RIGHT_BRAKELIGHT_GREEN: g,
-                    toy.LEDs.RIGHT_BRAKELIGHT_BLUE: b
-                }
-            else:
-                mapping = None
-
-            def __fallback():
-                if toy.implements(Sphero.set_main_led):
-                    toy.set_main_led(r, g, b)
-                elif not_supported_handler:
-                    not_supported_handler()
-
-            ToyUtil.set_multiple_leds(toy, mapping, __fallback)
-
-        ToyUtil.set_led_matrix_one_colour(toy, r, g, b, _fallback)
+        if toy.implements(IO.set_compressed_frame_player_one_color):
+            toy.set_compressed_frame_player_one_color(r, g, b)
+        elif _led_plan(toy, 'main') is not None:
+            _set_led_group(toy, 'main', (r, g, b))
+        elif toy.implements(Sphero.set_main_led):
+            toy.set_main_led(r, g, b)
+        elif not_supported_handler:
+            not_supported_handler()
 
     @staticmethod
     def set_head_led(toy: Toy, brightness: int, not_supported_handler: Callable[[], None] = None):
-        if isinstance(toy, BB9E):
-            ToyUtil.set_multiple_leds(toy, {BB9E.LEDs.HEAD: brightness}, not_supported_handler)
-        elif not_supported_handler:
-            not_supported_handler()
+        _set_led_group(toy, 'head', (brightness,), not_supported_handler)
 
     @staticmethod
     def set_front_led(toy: Toy, r: int, g: int, b: int, not_supported_handler: Callable[[], None] = None):
-        if isinstance(toy, RVR):
-            mapping = {
-                RVR.LEDs.RIGHT_HEADLIGHT_RED: r,
-                RVR.LEDs.RIGHT_HEADLIGHT_GREEN: g,
-                RVR.LEDs.RIGHT_HEADLIGHT_BLUE: b,
-                RVR.LEDs.LEFT_HEADLIGHT_RED: r,
-                RVR.LEDs.LEFT_HEADLIGHT_GREEN: g,
-                RVR.LEDs.LEFT_HEADLIGHT_BLUE: b
-            }
-        elif isinstance(toy, (R2D2, R2Q5, BOLT)):
-            mapping = {
-                toy.LEDs.FRONT_RED: r,
-                toy.LEDs.FRONT_GREEN: g,
-                toy.LEDs.FRONT_BLUE: b
-            }
-        else:
-            mapping = None
-        ToyUtil.set_multiple_leds(toy, mapping, not_supported_handler)
+        _set_led_group(toy, 'front', (r, g, b), not_supported_handler)
 
     @staticmethod
     def set_back_led(toy: Toy, r: int, g: int, b: int, not_supported_handler: Callable[[], None] = None):
-        if isinstance(toy, RVR):
-            mapping = {
-                RVR.LEDs.RIGHT_BRAKELIGHT_RED: r,
-                RVR.LEDs.RIGHT_BRAKELIGHT_GREEN: g,
-                RVR.LEDs.RIGHT_BRAKELIGHT_BLUE: b,
-                RVR.LEDs.LEFT_BRAKELIGHT_RED: r,
-                RVR.LEDs.LEFT_BRAKELIGHT_GREEN: g,
-                RVR.LEDs.LEFT_BRAKELIGHT_BLUE: b
-            }
-        elif isinstance(toy, (R2D2, R2Q5, BOLT)):
-            mapping = {
-                toy.LEDs.BACK_RED: r,
-                toy.LEDs.BACK_GREEN: g,
-                toy.LEDs.BACK_BLUE: b
-            }
-        else:
-            mapping = None
-        ToyUtil.set_multiple_leds(toy, mapping, not_supported_handler)
+        _set_led_group(toy, 'back', (r, g, b), not_supported_handler)
 
     @staticmethod
     def set_back_led_brightness(toy: Toy, brightness: int, not_supported_handler: Callable[[], None] = None):
-        if isinstance(toy, (R2D2, R2Q5, BOLT)):
-            mapping = {
-                toy.LEDs.BACK_RED: 0,
-                toy.LEDs.BACK_GREEN: 0,
-                toy.LEDs.BACK_BLUE: brightness,
-            }
-        elif isinstance(toy, (BB9E, Mini)):
-            mapping = {
-                toy.LEDs.AIMING: brightness
-            }
-        elif isinstance(toy, RVR):
-            mapping = {
-                RVR.LEDs.RIGHT_BRAKELIGHT_RED: 0,
-                RVR.LEDs.RIGHT_BRAKELIGHT_GREEN: 0,
-                RVR.LEDs.RIGHT_BRAKELIGHT_BLUE: brightness,
-                RVR.LEDs.LEFT_BRAKELIGHT_RED: 0,
-                RVR.LEDs.LEFT_BRAKELIGHT_GREEN: 0,
-                RVR.LEDs.LEFT_BRAKELIGHT_BLUE: brightness
-            }
-        else:
-            mapping = None
-
-        def _fallback():
-            if toy.implements(Sphero.set_back_led_brightness):
-                toy.set_back_led_brightness(brightness)
-            elif not_supported_handler:
-                not_supported_handler()
-
-        ToyUtil.set_multiple_leds(toy, mapping, _fallback)
+        if _led_plan(toy, 'back_brightness') is not None:
+            _set_led_group(toy, 'back_brightness', (0, brightness))
+        elif toy.implements(Sphero.set_back_led_brightness):
+            toy.set_back_led_brightness(brightness)
+        elif not_supported_handler:
+            not_supported_handler()
 
     @staticmethod
     def set_left_front_led(toy: Toy, r: int, g: int, b: int, not_supported_handler: Callable[[], None] = None):
-        mapping = None
-        if isinstance(toy, RVR):
-            mapping = {
-                RVR.LEDs.LEFT_HEADLIGHT_RED: r,
-                RVR.LEDs.LEFT_HEADLIGHT_GREEN: g,
-                RVR.LEDs.LEFT_HEADLIGHT_BLUE: b
-            }
-        ToyUtil.set_multiple_leds(toy, mapping, not_supported_handler)
+        _set_led_group(toy, 'left_front', (r, g, b), not_supported_handler)
 
     @staticmethod
     def set_right_front_led(toy: Toy, r: int, g: int, b: int, not_supported_handler: Callable[[], None] = None):
-        mapping = None
-        if isinstance(toy, RVR):
-            mapping = {
-                RVR.LEDs.RIGHT_HEADLIGHT_RED: r,
-                RVR.LEDs.RIGHT_HEADLIGHT_GREEN: g,
-                RVR.LEDs.RIGHT_HEADLIGHT_BLUE: b
-            }
-        ToyUtil.set_multiple_leds(toy, mapping, not_supported_handler)
+        _set_led_group(toy, 'right_front', (r, g, b), not_supported_handler)
 
     @staticmethod
     def set_battery_side_led(toy: Toy, r: int, g: int, b: int, not_supported_handler: Callable[[], None] = None):
-        mapping = None
-        if isinstance(toy, RVR):
-            mapping = {
-                RVR.LEDs.BATTERY_DOOR_FRONT_RED: r,
-                RVR.LEDs.BATTERY_DOOR_FRONT_GREEN: g,
-                RVR.LEDs.BATTERY_DOOR_FRONT_BLUE: b
-            }
-        ToyUtil.set_multiple_leds(toy, mapping, not_supported_handler)
+        _set_led_group(toy, 'battery_side', (r, g, b), not_supported_handler)
 
     @staticmethod
     def set_power_side_led(toy: Toy, r: int, g: int, b: int, not_supported_handler: Callable[[], None] = None):
-        mapping = None
-        if isinstance(toy, RVR):
-            mapping = {
-                RVR.LEDs.POWER_BUTTON_FRONT_RED: r,
-                RVR.LEDs.POWER_BUTTON_FRONT_GREEN: g,
-                RVR.LEDs.POWER_BUTTON_FRONT_BLUE: b
-            }
-        ToyUtil.set_multiple_leds(toy, mapping, not_supported_handler)
+        _set_led_group(toy, 'power_side', (r, g, b), not_supported_handler)
 
     @staticmethod
     def set_holo_projector(toy: Toy, brightness: int, not_supported_handler: Callable[[], None] = None):
-        if isinstance(toy, (R2D2, R2Q5)):
-            mapping = {toy.LEDs.HOLO_PROJECTOR: brightness}
-        else:
-            mapping = None
-        ToyUtil.set_multiple_leds(toy, mapping, not_supported_handler)
+        _set_led_group(toy, 'holo_projector', (brightness,), not_supported_handler)
 
     @staticmethod
     def set_logic_display(toy: Toy, brightness: int, not_supported_handler: Callable[[], None] = None):
-        if isinstance(toy, (R2D2, R2Q5)):
-            mapping = {toy.LEDs.LOGIC_DISPLAYS: brightness}
-        else:
-            mapping = None
-        ToyUtil.set_multiple_leds(toy, mapping, not_supported_handler)
+        _set_led_group(toy, 'logic_display', (brightness,), not_supported_handler)
 
     @staticmethod
     def set_multiple_leds(toy: Toy, mapping: Dict[IntEnum, int], not_supported_handler: Callable[[], None] = None):
@@ -391,23 +352,17 @@ class ToyUtil:
 
     @staticmethod
     def reset_locator(toy: Toy, not_supported_handler: Callable[[], None] = None):
-        if toy.implements(Sphero.configure_locator):
-            toy.configure_locator(0, 0, 0, 0)
-        elif toy.implements(Sensor.reset_locator_x_and_y):
-            toy.reset_locator_x_and_y()
+        action = _resolve(toy, 'reset_locator', _reset_locator)
+        if action is not None:
+            action(toy)
         elif not_supported_handler:
             not_supported_handler()
 
     @staticmethod
     def configure_collision_detection(toy: Toy, not_supported_handler: Callable[[], None] = None):
-        x, y, t = 90, 130, 1
-        if toy.implements(Sensor.configure_collision_detection):
-            toy.configure_collision_detection(CollisionDetectionMethods.ACCELEROMETER_BASED_DETECTION, x, y, x, y, t)
-        elif toy.implements(Sphero.configure_collision_detection):
-            toy.configure_collision_detection(SpheroCollisionDetectionMethods.DEFAULT, x, y, x, y, t)
-        elif toy.implements(Sensor.configure_sensitivity_based_collision_detection):
-            toy.configure_sensitivity_based_collision_detection(
-                SensitivityBasedCollisionDetectionMethods.ACCELEROMETER_BASED_DETECTION, SensitivityLevels.VERY_HIGH, t)
+        action = _resolve(toy, 'configure_collision_detection', _configure_collision_detection)
+        if action is not None:
+            action(toy)
         elif not_supported_handler:
             not_supported_handler()
 
@@ -477,12 +432,9 @@ class ToyUtil:
 
     @staticmethod
     def set_power_notifications(toy: Toy, enable: bool, not_supported_handler: Callable[[], None] = None):
-        if toy.implements(Power.enable_charger_state_changed_notify):
-            toy.enable_charger_state_changed_notify(enable)
-        elif toy.implements(Power.enable_battery_state_changed_notify):
-            toy.enable_battery_state_changed_notify(enable)
-        elif toy.implements(Power.enable_battery_voltage_state_change_notify):
-            toy.enable_battery_voltage_state_change_notify(enable)
+        action = _resolve(toy, 'set_power_notifications', _set_power_notifications)
+        if action is not None:
+            action(toy, enable)
         elif not_supported_handler:
             not_supported_handler()
 